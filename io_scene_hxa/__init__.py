@@ -21,9 +21,15 @@ if "bpy" in locals():
         importlib.reload(export_hxa_py)
 
 
-import bpy
-from . import import_hxa_py
-from . import export_hxa_py
+try:
+    import bpy
+except ImportError:
+    # outside of Blender(python -m io_scene_hxa) only the hxapy_* modules are usable
+    bpy = None
+
+if bpy is not None:
+    from . import import_hxa_py
+    from . import export_hxa_py
 
 
 def menu_func_import(self, context):
@@ -34,10 +40,11 @@ def menu_func_export(self, context):
     self.layout.operator(export_hxa_py.ExportHXA.bl_idname, text="HxA (.hxa)")
 
 
-classes = (
-    import_hxa_py.ImportHXA,
-    export_hxa_py.ExportHXA,
-)
+if bpy is not None:
+    classes = (
+        import_hxa_py.ImportHXA,
+        export_hxa_py.ExportHXA,
+    )
 
 
 def register():
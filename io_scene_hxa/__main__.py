@@ -0,0 +1,317 @@
+"""
+Command line tool for HxA files, runs without Blender:
+
+    python -m io_scene_hxa info     [--json] [--workers N] PATH...
+    python -m io_scene_hxa dump     [--workers N] PATH...
+    python -m io_scene_hxa stats    [--json] [--workers N] PATH...
+    python -m io_scene_hxa validate [--json] [--workers N] [--level LEVEL] PATH...
+
+PATHs can be files, globs("assets/**/*.hxa") or directories(searched for .hxa files).
+Files are processed in a pool of worker processes, the throughput goes to stderr.
+"""
+
+from . import hxapy_header as hxa
+from . import hxapy_read_write as hxa_rw
+from . import hxapy_toc as hxa_toc
+from . import hxapy_validate as hxa_valid
+from . import hxapy_compress as hxa_z
+from . import hxapy_batch as hxa_batch
+
+import os
+import sys
+import enum
+import json
+import time
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# *** JSON functions (start)
+
+
+def json_value(v):
+    """Turn enums, arrays, views and bytes into something json.dumps takes"""
+    if isinstance(v, enum.Enum):
+        return v.name
+    if isinstance(v, (bytes, bytearray)):
+        return v.hex()
+    if isinstance(v, (list, tuple)):
+        return [json_value(x) for x in v]
+    if isinstance(v, dict):
+        return {k: json_value(x) for k, x in v.items()}
+    if isinstance(v, memoryview) or hasattr(v, "tolist"):
+        return v.tolist()
+    return v
+
+
+def meta_json(meta):
+    data = meta.data
+    if meta.type == hxa.HXAMetaDataType.HXA_MDT_META:
+        data = [meta_json(child) for child in data]
+    return {
+        "name": meta.name,
+        "type": hxa.HXAMetaDataType(meta.type).name,
+        "data": json_value(data),
+    }
+
+
+# *** JSON functions (end)
+
+
+# *** Command functions (start)
+
+# Each command takes a path and returns a JSON-able report dict, they run in the
+# worker processes.
+
+
+def open_hxa(f, use_mmap=False, lazy=False):
+    if hxa_z.is_compressed(f):
+        return hxa_z.read_hxa_z(f)
+    return hxa_rw.read_hxa(f, use_mmap=use_mmap, lazy=lazy)
+
+
+def info_file(path):
+    with open(path, "rb") as f:
+        if hxa_z.is_compressed(f):
+            toc = hxa_z.read_index(f)[1]["toc"]
+        else:
+            toc = hxa_toc.scan_toc(f)
+
+    nodes = []
+    for toc_node in toc["nodes"]:
+        node = {
+            "type": hxa.HXANodeType(toc_node["type"]).name,
+            "offset": toc_node["offset"],
+            "metas": [meta["name"] for meta in toc_node["metas"]],
+            "stacks": {},
+        }
+        if "image_type" in toc_node:
+            node["image_type"] = hxa.HXAImageType(toc_node["image_type"]).name
+            node["resolution"] = toc_node["resolution"]
+        for name, stack in toc_node["stacks"].items():
+            node["stacks"][name] = {
+                "count": stack["count"],
+                "layers": [
+                    {
+                        "name": layer["name"],
+                        "components": layer["components"],
+                        "type": hxa.HXALayerDataType(layer["type"]).name,
+                        "offset": layer["offset"],
+                    }
+                    for layer in stack["layers"]
+                ],
+            }
+        nodes.append(node)
+
+    return {"version": toc["version"], "node_count": len(nodes), "nodes": nodes}
+
+
+def dump_file(path):
+    # only the metas are printed, so the layer data isn't read
+    with open(path, "rb") as f:
+        hxa_file = open_hxa(f, lazy=True)
+    return {
+        "version": hxa_file.version,
+        "nodes": [
+            {
+                "type": hxa.HXANodeType(node.type).name,
+                "meta_data": [meta_json(meta) for meta in node.meta_data],
+            }
+            for node in hxa_file.nodes
+        ],
+    }
+
+
+def layer_bounds(data, components):
+    """Per component minimum and maximum of a layer"""
+    if not len(data):
+        return None, None
+    if np is not None:
+        values = np.asarray(data).reshape(-1, components)
+        return values.min(axis=0).tolist(), values.max(axis=0).tolist()
+    values = [data[c::components] for c in range(components)]
+    return [min(v) for v in values], [max(v) for v in values]
+
+
+def stats_file(path):
+    with open(path, "rb") as f:
+        hxa_file = open_hxa(f, use_mmap=True)
+
+    layers = []
+    for nc, node in enumerate(hxa_file.nodes):
+        for stack_name, stack in node.stacks():
+            for layer in stack.layers:
+                data = hxa_rw.ensure_array(layer.data)
+                low, high = layer_bounds(data, layer.components)
+                layers.append(
+                    {
+                        "node": nc,
+                        "stack": stack_name,
+                        "name": layer.name,
+                        "type": hxa.HXALayerDataType(layer.type).name,
+                        "components": layer.components,
+                        "bytes": memoryview(data).nbytes,
+                        "min": low,
+                        "max": high,
+                    }
+                )
+
+    return {"node_count": hxa_file.node_count, "layers": layers}
+
+
+def validate_path(path, level):
+    # containers are validated at the requested level too, see validate_container
+    return hxa_valid.validate_file(path, level)
+
+
+def run_command(command, path):
+    """Worker: run command on path, returning its report or the error it raised"""
+    report = {"path": path, "size": 0}
+    try:
+        report["size"] = os.path.getsize(path)
+        report.update(command(path))
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+    return report
+
+
+# *** Command functions (end)
+
+
+# *** Output functions (start)
+
+
+def print_info(report):
+    print(
+        f"{report['path']}: version {report['version']}, "
+        f"{report['node_count']} nodes"
+    )
+    for nc, node in enumerate(report["nodes"]):
+        print(f"  node {nc}: {node['type']}, {len(node['metas'])} metas")
+        for name, stack in node["stacks"].items():
+            print(f"    {name}: {stack['count']} elements")
+            for layer in stack["layers"]:
+                print(
+                    f"      {layer['name']}: {layer['components']} x {layer['type']}"
+                )
+
+
+def print_dump(report):
+    print(json.dumps(report, indent=2))
+
+
+def print_stats(report):
+    print(f"{report['path']}: {report['node_count']} nodes")
+    for layer in report["layers"]:
+        print(
+            f"  node {layer['node']} {layer['stack']} {layer['name']}: "
+            f"{layer['bytes']} bytes, min {layer['min']}, max {layer['max']}"
+        )
+
+
+def print_validate(report):
+    if report["valid"]:
+        print(f"{report['path']}: valid")
+        return
+    print(f"{report['path']}: {len(report['errors'])} errors")
+    for e in report["errors"]:
+        print(f"  {hxa_valid.format_violation(e)}")
+
+
+COMMANDS = {
+    "info": (info_file, print_info),
+    "dump": (dump_file, print_dump),
+    "stats": (stats_file, print_stats),
+    "validate": (validate_path, print_validate),
+}
+
+
+# *** Output functions (end)
+
+
+def run(command, paths, workers=None):
+    """Yield the reports of command for paths, in order, from a pool of workers"""
+    task = functools.partial(run_command, command)
+    if workers == 1 or len(paths) < 2:
+        yield from map(task, paths)
+        return
+
+    workers = min(workers or os.cpu_count(), len(paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // workers // 4)
+        yield from executor.map(task, paths, chunksize=chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m io_scene_hxa", description="Inspect and validate HxA files"
+    )
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("paths", nargs="+", help="files, globs or directories")
+    parser.add_argument("--json", action="store_true", help="print one JSON report")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="worker processes(all cores)"
+    )
+    parser.add_argument(
+        "--level",
+        choices=hxa_valid.LEVELS,
+        default=hxa_valid.LEVEL_DEEP,
+        help="validation level",
+    )
+    args = parser.parse_args(argv)
+
+    command, print_report = COMMANDS[args.command]
+    if args.command == "validate":
+        command = functools.partial(command, level=args.level)
+
+    paths = list(hxa_batch.expand_paths(args.paths))
+    start = time.perf_counter()
+    reports = []
+    failed = 0
+    for report in run(command, paths, args.workers):
+        reports.append(report)
+        if "error" in report or not report.get("valid", True):
+            failed += 1
+        if args.json:
+            continue
+        if "error" in report:
+            print(f"{report['path']}: {report['error']}")
+        else:
+            print_report(report)
+    seconds = time.perf_counter() - start
+
+    size = sum(report["size"] for report in reports)
+    summary = {
+        "files": len(reports),
+        "failed": failed,
+        "bytes": size,
+        "seconds": seconds,
+        "files_per_second": len(reports) / seconds if seconds else 0.0,
+        "mb_per_second": size / 1e6 / seconds if seconds else 0.0,
+    }
+    if args.json:
+        json.dump(
+            {"command": args.command, "files": reports, "summary": summary},
+            sys.stdout,
+            indent=2,
+            default=json_value,
+        )
+        print()
+
+    print(
+        f"{summary['files']} files({summary['failed']} failed), {size / 1e6:.1f} MB "
+        f"in {seconds:.2f}s: {summary['files_per_second']:.1f} files/s, "
+        f"{summary['mb_per_second']:.1f} MB/s",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
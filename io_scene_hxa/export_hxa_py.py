@@ -1,7 +1,6 @@
 import bpy
-import bmesh
 
-from bpy.props import StringProperty
+from bpy.props import BoolProperty, StringProperty
 from bpy_extras.io_utils import (
     ExportHelper,
     # orientation_helper
@@ -10,6 +9,7 @@ from bpy_extras.io_utils import (
 
 from . import hxapy_header as hxa
 from . import hxapy_util as hxa_util
+from . import hxapy_topology as hxa_topology
 from . import hxapy_read_write as hxa_rw
 from . import hxapy_validate as hxa_valid
 
@@ -27,6 +27,11 @@ class ExportHXA(bpy.types.Operator, ExportHelper):
 
     filename_ext = ".hxa"
     filter_glob: StringProperty(default="*.hxa", options={"HIDDEN"})
+    triangulate: BoolProperty(
+        name="Triangulate",
+        description="Write triangles, with their source polygon in the face stack",
+        default=False,
+    )
 
     def execute(self, context):
         if bpy.ops.object.mode_set.poll():
@@ -34,25 +39,31 @@ class ExportHXA(bpy.types.Operator, ExportHelper):
 
         TransformToDX(context.object)
 
-        hxa_dict = export_payload(context)
-        if not hxa_valid.hxa_util_validate(hxa_dict):
-            log.info(f"{self.filepath} couldn't pass validation")
-            self.report({"ERROR"}, f"{self.filepath} couldn't pass validation")
-            return {"CANCELLED"}
-
+        # the file is streamed to a temporary file, read back for validation,
+        # and only replaces self.filepath if it passes. Disk writes happen on a
+        # background thread, while the next section is being extracted.
         try:
-            f = open(self.filepath, "wb")
+            with hxa_rw.atomic_open(self.filepath) as f:
+                with hxa_rw.BackgroundWriter(f) as bf, hxa_rw.HXAWriter(bf) as writer:
+                    export_payload(context, writer, self.triangulate)
+
+                f.seek(0)
+                if not hxa_valid.hxa_util_validate(hxa_rw.read_hxa(f, lazy=True)):
+                    raise hxa_valid.HXAValidationError(
+                        f"{self.filepath} couldn't pass validation"
+                    )
+        except hxa_valid.HXAValidationError as e:
+            log.info(str(e))
+            self.report({"ERROR"}, str(e))
+            return {"CANCELLED"}
         except OSError:
-            log.info(f"HXA Error: File {self.filepath} could not be open for writing\n")
+            log.info(f"HXA Error: File {self.filepath} could not be written\n")
             self.report(
                 {"ERROR"},
-                f"HXA Error: File {self.filepath} could not be open for writing\n",
+                f"HXA Error: File {self.filepath} could not be written\n",
             )
             return {"CANCELLED"}
 
-        hxa_rw.write_hxa(f, hxa_dict)
-        f.close()
-
         TransformFromDX(context.object)
 
         return {"FINISHED"}
@@ -141,8 +152,7 @@ def TransformFromDX(ob):
 
 
 def hxa_meta(name, typ, data):
-    m = {"name": name, "type": typ, "data": data}
-    return m
+    return hxa.HXAMeta(name, typ, data)
 
 
 def meta__armature_data(arm_ob, arm):
@@ -166,8 +176,8 @@ def meta__armature_data(arm_ob, arm):
     for t in tails:
         log.debug(t)
 
-    heads = hxa_util.flatten_list(heads)
-    tails = hxa_util.flatten_list(tails)
+    heads = hxa_util.flatten(heads, "d")
+    tails = hxa_util.flatten(tails, "d")
     names = [x.name for x in arm.bones]
     parents = [x.parent.name if x.parent else "" for x in arm.bones]
 
@@ -240,46 +250,20 @@ def hxapy_type_meta(typ):
 
 
 # def ExportPayload(context, filepath):
-def export_payload(context):
+def export_payload(context, writer, triangulate=False):
     """
-    The overarching function to produce our dictionary representation of a HxA file,
-    before we write it to disk.
+    The overarching function to produce a HxA file. Every section goes to the
+    HXAWriter as soon as it has been extracted, metas first, then the geometry.
+    With triangulate, faces are fan triangulated.
     """
     
     # ob_mesh, ob_arm = GetMeshAndArmature(bpy.context.object)
     ob_mesh, ob_arm = GetMeshAndArmature(context.object)
-    
-    bm = bmesh.new()
-    # - switch orientations to DX12
-    
-    # if there's no armature, we rotate the object.
     me = ob_mesh.data
-    bm.from_mesh(me)
 
-
-    vert_count = len(bm.verts)
-    face_count = len(bm.faces)
-    verts = [[c for c in v.co] for v in bm.verts]
-    faces = [f for f in bm.faces]
-    references = [[v.index for v in f.verts] for f in faces]
-    references = [
-        [-x - 1 if _ref.index(x) == len(_ref) - 1 else x for x in _ref]
-        for _ref in references
-    ]
-
-    verts = hxa_util.flatten_list(verts)
-    references = hxa_util.flatten_list(references)
-    log.debug(verts)
-    log.debug(references)
-
-    bm.free()
-
-    hxa_dict = {}
-    hxa_dict["version"] = hxa.HXA_VERSION_FORMAT
-    hxa_dict["node_count"] = 1
+    writer.begin_node(hxa.HXANodeType.HXA_NT_GEOMETRY)
 
     # *** Meta data
-    meta_data = []
 
     # ** Mesh(meta) data
     meta_meshdata_entries = []
@@ -298,7 +282,7 @@ def export_payload(context):
         hxa_meta("meta scale", hxa.HXAMetaDataType.HXA_MDT_DOUBLE, ob_mesh.scale[:])
     )
 
-    meta_data.append(
+    writer.add_meta(
         hxa_meta(
             "meta mesh data", hxa.HXAMetaDataType.HXA_MDT_META, meta_meshdata_entries
         )
@@ -309,59 +293,55 @@ def export_payload(context):
         object_shapekeys = ob_mesh.data.shape_keys.key_blocks
         shapekey_count = len(object_shapekeys)
 
-        meta_shapekeys_data = []
+        # one key at a time, each is written out before the next one is extracted
+        writer.begin_meta("meta shapekeys")
         for i in range(shapekey_count):
             name = object_shapekeys[i].name
-            shapekey_values = []
-            for x in object_shapekeys[i].data.values():
-                shapekey_values += [y for y in x.co]
+            # co is float32, foreach_get only takes a matching buffer in one go
+            co = hxa_util.new_array("f", len(me.vertices) * 3)
+            object_shapekeys[i].data.foreach_get("co", co)
+            shapekey_values = hxa_util.as_buffer(co, "d")
 
-            meta_shapekeys_data.append(
+            writer.add_meta(
                 hxa_meta(name, hxa.HXAMetaDataType.HXA_MDT_DOUBLE, shapekey_values)
             )
-
-        meta_data.append(
-            hxa_meta(
-                "meta shapekeys", hxa.HXAMetaDataType.HXA_MDT_META, meta_shapekeys_data
-            )
-        )
+        writer.end_meta()
 
     if ob_arm:
         arm = ob_arm.data
         meta_armaturedata = meta__armature_data(ob_arm, arm)
-        meta_data.append(meta_armaturedata)
+        writer.add_meta(meta_armaturedata)
 
     # ** Vertex weights
-    if len(meta_data) > 0:
-        indexes_list, weights_list = extract_weights(ob_mesh)
-
-        vgroup_count = len(ob_mesh.vertex_groups)
-        if vgroup_count:
-            # vertex indexes
-            meta_weightindexes_data = [
-                hxa_meta("", hxa.HXAMetaDataType.HXA_MDT_INT64, indexes_list[i])
-                for i in range(vgroup_count)
-            ]
-            meta_data.append(
-                hxa_meta(
-                    "meta weight indexes",
-                    hxa.HXAMetaDataType.HXA_MDT_META,
-                    meta_weightindexes_data,
-                )
+    indexes_list, weights_list = extract_weights(ob_mesh)
+
+    vgroup_count = len(ob_mesh.vertex_groups)
+    if vgroup_count:
+        # vertex indexes
+        meta_weightindexes_data = [
+            hxa_meta("", hxa.HXAMetaDataType.HXA_MDT_INT64, indexes_list[i])
+            for i in range(vgroup_count)
+        ]
+        writer.add_meta(
+            hxa_meta(
+                "meta weight indexes",
+                hxa.HXAMetaDataType.HXA_MDT_META,
+                meta_weightindexes_data,
             )
+        )
 
-            # vertex weights
-            meta_vertexweights_data = [
-                hxa_meta("", hxa.HXAMetaDataType.HXA_MDT_DOUBLE, weights_list[i])
-                for i in range(vgroup_count)
-            ]
-            meta_data.append(
-                hxa_meta(
-                    "meta vertex weights",
-                    hxa.HXAMetaDataType.HXA_MDT_META,
-                    meta_vertexweights_data,
-                )
+        # vertex weights
+        meta_vertexweights_data = [
+            hxa_meta("", hxa.HXAMetaDataType.HXA_MDT_DOUBLE, weights_list[i])
+            for i in range(vgroup_count)
+        ]
+        writer.add_meta(
+            hxa_meta(
+                "meta vertex weights",
+                hxa.HXAMetaDataType.HXA_MDT_META,
+                meta_vertexweights_data,
             )
+        )
 
     # ** creases
     creases = [x.crease for x in me.edges]
@@ -375,7 +355,7 @@ def export_payload(context):
     log.debug(f"> {edges}")
     # sorted_edges = sorted(edges, key = lambda x: (x[0], x[1]))
     sorted_edges, sorted_creases = zip(*crease_tuples)
-    edge_verts = hxa_util.flatten_list(sorted_edges)
+    edge_verts = hxa_util.flatten(sorted_edges, "q")
     log.debug(f"Edge verts: {edge_verts}")
 
     # check for !=0 creases
@@ -389,7 +369,7 @@ def export_payload(context):
             hxa_meta("", hxa.HXAMetaDataType.HXA_MDT_DOUBLE, sorted_creases)
         )
 
-        meta_data.append(
+        writer.add_meta(
             hxa_meta(
                 "meta creases",
                 hxa.HXAMetaDataType.HXA_MDT_META,
@@ -406,30 +386,15 @@ def export_payload(context):
             import idprop
 
             if type(customprop) == idprop.types.IDPropertyArray:
-                al = len(customprop)
-                mtype = hxa.HXAMetaDataType(type(customprop[0]))
+                mtype = hxapy_type_meta(type(customprop[0]))
                 data = list(customprop)
             else:
-                mtype = hxa.HXAMetaDataType(type(customprop))
+                mtype = hxapy_type_meta(type(customprop))
                 data = customprop
-                if mtype == hxa.HXA_MDT_TEXT:
-                    al = len(data)
-                else:
-                    al = 1
-
-            meta_cp_name = cp
-            meta_cp = {
-                "name_length": len(meta_cp_name),
-                "name": meta_cp_name,
-                "type": hxa.HXAMetaDataType(mtype).value,
-                "array_length": al,
-                "data": data,
-            }
-            meta_customprops_data.append(meta_cp)
-            # - I'll do this later. Might not be as straightforward.
-            # meta_customprops_data.append(hxa_meta(meta_cp_name, hxa.HXAMetaType(mtype).value, data))
-
-        meta_data.append(
+
+            meta_customprops_data.append(hxa_meta(cp, mtype, data))
+
+        writer.add_meta(
             hxa_meta(
                 "meta custom properties",
                 hxa.HXAMetaDataType.HXA_MDT_META,
@@ -438,44 +403,54 @@ def export_payload(context):
         )
 
     # *** Mesh(geometry) data
-    vertex_layer = {
-        "name_length": len(hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME),
-        "name": hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME,
-        "components": hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_COMPONENTS,
-        "type": hxa.HXALayerDataType.HXA_LDT_FLOAT,
-        "data": verts,
-    }
-    vert_stack = {"layer_count": 1, "layers": [vertex_layer]}
-
-    reference_layer = {
-        "name_length": len(hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME),
-        "name": hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME,
-        "components": hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_COMPONENTS,
-        "type": hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_TYPE,
-        "data": references,
-    }
-    corner_stack = {"layer_count": 1, "layers": [reference_layer]}
-
-    edge_stack = {"layer_count": 0, "layers": []}
-
-    face_stack = {"layer_count": 0, "layers": []}
-
-    content = {
-        "vertex_count": vert_count,
-        "vertex_stack": vert_stack,
-        "edge_corner_count": len(references),
-        "corner_stack": corner_stack,
-        "edge_stack": edge_stack,
-        "face_count": face_count,
-        "face_stack": face_stack,
-    }
-    node = {
-        "type": hxa.HXANodeType.HXA_NT_GEOMETRY,
-        "meta_data_count": len(meta_data),
-        "meta_data": meta_data,
-        "content": content,
-    }
-    hxa_dict["nodes"] = [node]
+    verts = hxa_util.new_array("f", len(me.vertices) * 3)
+    me.vertices.foreach_get("co", verts)
+
+    face_count = len(me.polygons)
+    offsets = hxa_util.new_array("i", face_count)
+    sizes = hxa_util.new_array("i", face_count)
+    corners = hxa_util.new_array("i", len(me.loops))
+    me.polygons.foreach_get("loop_start", offsets)
+    me.polygons.foreach_get("loop_total", sizes)
+    me.loops.foreach_get("vertex_index", corners)
+    # loops aren't guaranteed to be stored in polygon order
+    corners = hxa_util.gather_corners(offsets, sizes, corners)
+    references = hxa_util.encode_faces(sizes, corners)
+    if triangulate:
+        triangles, source_faces = hxa_util.triangulate(references)
+        references = hxa_util.encode_triangles(triangles)
+        face_count = len(source_faces)
+    log.debug(verts)
+    log.debug(references)
 
-        
-    return hxa_dict
+    writer.add_layer(
+        "vertex_stack",
+        hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME,
+        hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_COMPONENTS,
+        hxa.HXALayerDataType.HXA_LDT_FLOAT,
+        verts,
+    )
+    writer.add_layer(
+        "corner_stack",
+        hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME,
+        hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_COMPONENTS,
+        hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_TYPE,
+        references,
+    )
+    topology = hxa_topology.build_topology(references)
+    writer.add_layer(
+        "edge_stack",
+        hxa.HXA_CONVENTION_HARD_EDGE_NEIGHBOUR_LAYER_NAME,
+        1,
+        hxa.HXA_CONVENTION_HARD_EDGE_NEIGHBOUR_LAYER_TYPE,
+        topology["neighbour"],
+    )
+    writer.set_count("face_stack", face_count)
+    if triangulate:
+        writer.add_layer(
+            "face_stack",
+            hxa_util.SOURCE_FACE_LAYER_NAME,
+            1,
+            hxa.HXALayerDataType.HXA_LDT_INT32,
+            source_faces,
+        )
@@ -0,0 +1,99 @@
+from . import hxapy_read_write as hxa_rw
+from . import hxapy_validate as hxa_valid
+from . import hxapy_compress as hxa_z
+
+import os
+import glob
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+log = logging.getLogger(__name__)
+
+
+# Files are parsed and validated in worker processes. Workers parse lazily, so what
+# travels back is the node/meta skeleton and each layer's offset;
+# the layer data itself is never pickled. The parent maps the file again and the layers
+# decode as zero-copy views into that mapping, sharing the OS page cache with the workers.
+
+def load_one(path, level=hxa_valid.LEVEL_DEEP):
+    """
+    Worker: parse and validate one file, returning a result dict instead of raising.
+    The lazy parse doesn't read the layers, so validity comes from validate_file,
+    which checks every layer's extent(and trailing data) against the file size.
+    """
+    result = {"path": path, "hxa_file": None, "valid": False, "error": None}
+    try:
+        report = hxa_valid.validate_file(path, level)
+        for e in report["errors"]:
+            log.info(f"HxA Verify Error: {hxa_valid.format_violation(e)}")
+        result["valid"] = report["valid"]
+        with open(path, "rb") as f:
+            hxa_file = hxa_rw.read_hxa(f, lazy=True)
+        result["hxa_file"] = hxa_file
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    return result
+
+
+def attach_layers(result):
+    """Parent: map the file and point every lazy layer of the result at the mapping"""
+    hxa_file = result["hxa_file"]
+    if hxa_file is None:
+        return result
+
+    with open(result["path"], "rb") as f:
+        mm = hxa_rw.map_file(f)
+
+    for node in hxa_file.nodes:
+        for _, stack in node.stacks():
+            for layer in stack.layers:
+                layer.attach(mm)
+
+    return result
+
+
+def expand_paths(paths, suffixes=(".hxa", hxa_z.CONTAINER_SUFFIX)):
+    """
+    Directories are searched(recursively) for files ending in one of suffixes(.hxa
+    and .hxa.z by default), globs("**" included) are expanded, everything else is
+    kept as is
+    """
+    for pattern in paths:
+        matches = [pattern]
+        if not os.path.exists(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True)) or matches
+
+        for path in matches:
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for name in sorted(files):
+                        if name.lower().endswith(suffixes):
+                            yield os.path.join(root, name)
+            else:
+                yield path
+
+
+def load_many(
+    paths, workers=None, ordered=True, chunksize=8, level=hxa_valid.LEVEL_DEEP
+):
+    """
+    Parse and validate(at level, see hxa_valid.validate_file) many HxA files in a
+    process pool.
+    Yields one result dict per file: {"path", "hxa_file", "valid", "error"}, in input order
+    if ordered, otherwise as the files complete. A file that fails to load has
+    hxa_file None and the reason in "error"; the other files carry on.
+    """
+    paths = list(expand_paths(paths, (".hxa",)))
+    workers = workers or os.cpu_count()
+    task = functools.partial(load_one, level=level)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if ordered:
+            for result in executor.map(task, paths, chunksize=chunksize):
+                yield attach_layers(result)
+        else:
+            futures = [executor.submit(task, path) for path in paths]
+            for future in as_completed(futures):
+                yield attach_layers(future.result())
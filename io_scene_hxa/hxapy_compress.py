@@ -0,0 +1,214 @@
+from . import hxapy_read_write as hxa_rw
+from . import hxapy_toc as hxa_toc
+
+import io
+import json
+import lzma
+import zlib
+import struct
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+# A .hxa.z container holds a regular HxA file, cut into chunks that are compressed
+# independently(zlib or lzma). Layers always start a new chunk, so a single layer can be
+# decompressed on its own, everything between layers(header, metas, counts) goes into
+# chunks of its own. Both codecs release the GIL, so chunks are (de)compressed in
+# threads.
+#
+#   magic "HxAz", u8 container version, u8 codec, u32 index size
+#   index: JSON, the TOC of the raw file(see hxapy_toc) with each layer's chunk range,
+#          and a [raw offset, raw size, offset, size] entry per chunk
+#   chunks, offsets relative to the end of the index
+
+CONTAINER_MAGIC = b"HxAz"
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = struct.Struct("<4sBBI")
+CONTAINER_SUFFIX = ".hxa.z"
+
+CODEC_ZLIB = 0
+CODEC_LZMA = 1
+CODECS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+CHUNK_SIZE = 1 << 20
+
+
+# *** Codec functions (start)
+
+
+def compress_chunk(data, codec, level):
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, 6 if level is None else level)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, preset=6 if level is None else level)
+    raise RuntimeError(f"HXA Error: unknown container codec {codec}")
+
+
+def decompress_chunk(data, codec):
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data)
+    raise RuntimeError(f"HXA Error: unknown container codec {codec}")
+
+
+# *** Codec functions (end)
+
+
+# *** Write functions (start)
+
+
+def layer_ranges(toc):
+    """Yield the TOC entry and the raw byte range(header included) of every layer"""
+    for node in toc["nodes"]:
+        for stack in node["stacks"].values():
+            for layer in stack["layers"]:
+                yield (layer,) + hxa_toc.layer_range(stack, layer)
+
+
+def split_chunks(toc, raw_size, chunk_size):
+    """
+    Cut the raw file into [start, end) ranges of at most chunk_size bytes, starting a
+    new range at the beginning and end of every layer. Each layer's entry of the TOC
+    gets the [first, end) indexes of the chunks that hold it.
+    """
+    ranges = []
+
+    def add(start, end):
+        for o in range(start, end, chunk_size):
+            ranges.append((o, min(o + chunk_size, end)))
+
+    position = 0
+    for layer, start, end in layer_ranges(toc):
+        add(position, start)
+        first = len(ranges)
+        add(start, end)
+        layer["chunks"] = [first, len(ranges)]
+        position = end
+    add(position, raw_size)
+
+    return ranges
+
+
+def write_hxa_z(
+    f, hxa_file, codec="zlib", level=None, chunk_size=CHUNK_SIZE, workers=None
+):
+    """Write hxa_file to f as a compressed .hxa.z container"""
+    codec = CODECS[codec]
+    raw = hxa_rw.serialize_hxa(hxa_file)
+    toc = hxa_toc.scan_toc(io.BytesIO(raw))
+    ranges = split_chunks(toc, len(raw), chunk_size)
+
+    mv = memoryview(raw)
+    with ThreadPoolExecutor(workers) as pool:
+        chunks = list(
+            pool.map(lambda r: compress_chunk(mv[r[0]:r[1]], codec, level), ranges)
+        )
+
+    index = []
+    offset = 0
+    for (start, end), chunk in zip(ranges, chunks):
+        index.append([start, end - start, offset, len(chunk)])
+        offset += len(chunk)
+
+    index_data = json.dumps(
+        {"raw_size": len(raw), "toc": toc, "chunks": index}, separators=(",", ":")
+    ).encode("utf-8")
+    f.write(
+        CONTAINER_HEADER.pack(
+            CONTAINER_MAGIC, CONTAINER_VERSION, codec, len(index_data)
+        )
+    )
+    f.write(index_data)
+    for chunk in chunks:
+        f.write(chunk)
+
+    log.debug(f"Compressed {len(raw)} bytes into {offset} in {len(chunks)} chunks")
+
+
+def save_hxa_z(
+    path, hxa_file, codec="zlib", level=None, chunk_size=CHUNK_SIZE, workers=None
+):
+    """Write hxa_file to path as a .hxa.z container, atomically"""
+    with hxa_rw.atomic_open(path) as f:
+        write_hxa_z(f, hxa_file, codec, level, chunk_size, workers)
+
+
+# *** Write functions (end)
+
+
+# *** Read functions (start)
+
+
+def is_compressed(f):
+    """Check(without moving f) whether f holds a .hxa.z container"""
+    position = f.tell()
+    magic = f.read(len(CONTAINER_MAGIC))
+    f.seek(position)
+    return magic == CONTAINER_MAGIC
+
+
+def read_index(f):
+    """Read the container header and index, returning (codec, index, chunks offset)"""
+    header = f.read(CONTAINER_HEADER.size)
+    if len(header) != CONTAINER_HEADER.size:
+        raise RuntimeError("HXA Error: truncated .hxa.z container")
+    magic, version, codec, index_size = CONTAINER_HEADER.unpack(header)
+    if magic != CONTAINER_MAGIC:
+        raise RuntimeError("HXA Error: not a .hxa.z container(incorrect magic number)")
+    if version > CONTAINER_VERSION:
+        raise RuntimeError(f"HXA Error: unsupported .hxa.z container version {version}")
+
+    index = json.loads(f.read(index_size).decode("utf-8"))
+    return codec, index, f.tell()
+
+
+def read_chunks(f, codec, chunks, base, workers=None):
+    """Read and decompress the given index entries, returning the raw bytes they hold"""
+    if not chunks:
+        return b""
+
+    # the chunks are contiguous, so they are read in one go
+    start = chunks[0][2]
+    f.seek(base + start)
+    data = memoryview(f.read(chunks[-1][2] + chunks[-1][3] - start))
+
+    def decompress(entry):
+        o = entry[2] - start
+        raw = decompress_chunk(data[o:o + entry[3]], codec)
+        if len(raw) != entry[1]:
+            raise RuntimeError("HXA Error: corrupt .hxa.z chunk")
+        return raw
+
+    if len(chunks) == 1:
+        return decompress(chunks[0])
+    with ThreadPoolExecutor(workers) as pool:
+        return b"".join(pool.map(decompress, chunks))
+
+
+def read_hxa_z(f, workers=None):
+    """Read a whole .hxa.z container into a HXAFile"""
+    codec, index, base = read_index(f)
+    raw = read_chunks(f, codec, index["chunks"], base, workers)
+    if len(raw) != index["raw_size"]:
+        raise RuntimeError("HXA Error: corrupt .hxa.z container")
+
+    return hxa_rw.read_hxa_buffer(raw, copy=False)
+
+
+def read_layer_z(f, node, stack, name, workers=None):
+    """Decompress and read one layer(by stack and layer name) of node number node"""
+    codec, index, base = read_index(f)
+    layerstack = index["toc"]["nodes"][node]["stacks"][stack]
+    for layer in layerstack["layers"]:
+        if layer["name"] == name:
+            first, end = layer["chunks"]
+            raw = read_chunks(f, codec, index["chunks"][first:end], base, workers)
+            return hxa_rw.read_layer(io.BytesIO(raw), layerstack["count"])
+
+    raise KeyError(f"HXA Error: node {node} has no layer {name} in its {stack}")
+
+
+# *** Read functions (end)
@@ -86,3 +86,255 @@ HXA_CONVENTION_SOFT_AMBIENT_OCCLUSION = "ambient_occlusion"
 # tags layers
 HXA_CONVENTION_SOFT_NAME      = "name"
 HXA_CONVENTION_SOFT_TRANSFORM = "transform"
+
+
+# - Structs
+# Mirrors of the structs in hxa.h. Item access(node["meta_data_count"], node["content"]["vertex_stack"], ...)
+# keeps working for code written against the nested dicts the reader used to return,
+# as do "in", keys()/items(), iteration and dict(struct) over the keys of the dict form;
+# from_dict/to_dict convert between the two.
+
+
+class HXAStruct:
+    __slots__ = ()
+    # the keys of the dict form: the struct's __slots__, plus its computed keys
+    KEYS = ()
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        return isinstance(key, str) and hasattr(self, key)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class HXAMeta(HXAStruct):
+    __slots__ = ("name", "type", "data")
+    KEYS = __slots__
+
+    def __init__(self, name, type, data):
+        self.name = name
+        self.type = type
+        self.data = data
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, HXAMeta):
+            return d
+        data = d["data"]
+        if d["type"] == HXAMetaDataType.HXA_MDT_META:
+            data = [HXAMeta.from_dict(child) for child in data]
+        return cls(d["name"], d["type"], data)
+
+    def to_dict(self):
+        data = self.data
+        if self.type == HXAMetaDataType.HXA_MDT_META:
+            data = [child.to_dict() for child in data]
+        return {"name": self.name, "type": self.type, "data": data}
+
+
+class HXALayer(HXAStruct):
+    __slots__ = ("name", "components", "type", "data")
+    KEYS = __slots__
+
+    def __init__(self, name, components, type, data):
+        self.name = name
+        self.components = components
+        self.type = type
+        self.data = data
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, HXALayer):
+            return d
+        return cls(d["name"], d["components"], d["type"], d["data"])
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "components": self.components,
+            "type": self.type,
+            "data": self.data,
+        }
+
+
+class HXALayerStack(HXAStruct):
+    __slots__ = ("layers",)
+    KEYS = ("layer_count", "layers")
+
+    def __init__(self, layers=None):
+        self.layers = layers if layers is not None else []
+
+    @property
+    def layer_count(self):
+        return len(self.layers)
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, HXALayerStack):
+            return d
+        return cls([HXALayer.from_dict(layer) for layer in d["layers"]])
+
+    def to_dict(self):
+        return {
+            "layer_count": self.layer_count,
+            "layers": [layer.to_dict() for layer in self.layers],
+        }
+
+
+class HXANode(HXAStruct):
+    """
+    A node. The content union of the C struct is flattened into the node itself,
+    node["content"] returns the node for dict-style access.
+    """
+
+    __slots__ = (
+        "type",
+        "meta_data",
+        # geometry
+        "vertex_count",
+        "vertex_stack",
+        "edge_corner_count",
+        "corner_stack",
+        "edge_stack",
+        "face_count",
+        "face_stack",
+        # image
+        "image_type",
+        "resolution",
+        "image_stack",
+    )
+    KEYS = ("type", "meta_data_count", "meta_data", "content")
+
+    def __init__(self, type, meta_data=None):
+        self.type = type
+        self.meta_data = meta_data if meta_data is not None else []
+        self.vertex_count = 0
+        self.vertex_stack = HXALayerStack()
+        self.edge_corner_count = 0
+        self.corner_stack = HXALayerStack()
+        self.edge_stack = HXALayerStack()
+        self.face_count = 0
+        self.face_stack = HXALayerStack()
+        self.image_type = HXAImageType.HXA_IT_2D_IMAGE
+        self.resolution = [1, 1, 1]
+        self.image_stack = HXALayerStack()
+
+    @property
+    def meta_data_count(self):
+        return len(self.meta_data)
+
+    @property
+    def image_dimensions(self):
+        """How many resolution values are stored: a cube image stores the size of one face"""
+        if self.image_type == HXAImageType.HXA_IT_CUBE_IMAGE:
+            return 2
+        return int(self.image_type)
+
+    @property
+    def pixel_count(self):
+        count = self.resolution[0] * self.resolution[1] * self.resolution[2]
+        if self.image_type == HXAImageType.HXA_IT_CUBE_IMAGE:
+            count *= 6
+        return count
+
+    def stacks(self):
+        """(name, layer stack) pairs of the stacks this node type has, in file order"""
+        if self.type == HXANodeType.HXA_NT_GEOMETRY:
+            names = ("vertex_stack", "corner_stack", "edge_stack", "face_stack")
+        elif self.type == HXANodeType.HXA_NT_IMAGE:
+            names = ("image_stack",)
+        else:
+            names = ()
+        return [(name, getattr(self, name)) for name in names]
+
+    @property
+    def content(self):
+        return self
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, HXANode):
+            return d
+        node = cls(d["type"], [HXAMeta.from_dict(meta) for meta in d["meta_data"]])
+
+        content = d.get("content", {})
+        if node.type == HXANodeType.HXA_NT_GEOMETRY:
+            node.vertex_count = content["vertex_count"]
+            node.vertex_stack = HXALayerStack.from_dict(content["vertex_stack"])
+            node.edge_corner_count = content["edge_corner_count"]
+            node.corner_stack = HXALayerStack.from_dict(content["corner_stack"])
+            node.edge_stack = HXALayerStack.from_dict(content["edge_stack"])
+            node.face_count = content["face_count"]
+            node.face_stack = HXALayerStack.from_dict(content["face_stack"])
+        elif node.type == HXANodeType.HXA_NT_IMAGE:
+            node.image_type = content["image_type"]
+            node.resolution = list(content["resolution"])
+            node.image_stack = HXALayerStack.from_dict(content["image_stack"])
+
+        return node
+
+    def to_dict(self):
+        content = {}
+        if self.type == HXANodeType.HXA_NT_GEOMETRY:
+            content["vertex_count"] = self.vertex_count
+            content["vertex_stack"] = self.vertex_stack.to_dict()
+            content["edge_corner_count"] = self.edge_corner_count
+            content["corner_stack"] = self.corner_stack.to_dict()
+            content["edge_stack"] = self.edge_stack.to_dict()
+            content["face_count"] = self.face_count
+            content["face_stack"] = self.face_stack.to_dict()
+        elif self.type == HXANodeType.HXA_NT_IMAGE:
+            content["image_type"] = self.image_type
+            content["resolution"] = list(self.resolution)
+            content["image_stack"] = self.image_stack.to_dict()
+
+        return {
+            "type": self.type,
+            "meta_data_count": self.meta_data_count,
+            "meta_data": [meta.to_dict() for meta in self.meta_data],
+            "content": content,
+        }
+
+
+class HXAFile(HXAStruct):
+    __slots__ = ("version", "nodes")
+    KEYS = ("version", "node_count", "nodes")
+
+    def __init__(self, version=HXA_VERSION_FORMAT, nodes=None):
+        self.version = version
+        self.nodes = nodes if nodes is not None else []
+
+    @property
+    def node_count(self):
+        return len(self.nodes)
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, HXAFile):
+            return d
+        return cls(d["version"], [HXANode.from_dict(node) for node in d["nodes"]])
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "node_count": self.node_count,
+            "nodes": [node.to_dict() for node in self.nodes],
+        }
@@ -0,0 +1,197 @@
+from . import hxapy_header as hxa
+from . import hxapy_read_write as hxa_rw
+
+import os
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# A table of contents(TOC) holds the byte offset of every node, top level meta and layer
+# of a HxA file, so a single node or layer can be read without parsing everything before it.
+# It can be cached next to the file as "<file>.toc"(JSON), keyed by the file's size and mtime.
+
+TOC_VERSION = 2
+TOC_SUFFIX = ".toc"
+
+
+# *** Scan functions (start)
+
+
+def skip_meta(f):
+    hxa_rw.read_name(f)
+    mtype = hxa.HXAMetaDataType(hxa_rw.read_u8(f))
+    length = hxa_rw.read_u32(f)
+
+    if mtype == hxa.HXAMetaDataType.HXA_MDT_META:
+        for _ in range(length):
+            skip_meta(f)
+        return
+
+    if mtype == hxa.HXAMetaDataType.HXA_MDT_INT64:
+        size = 8
+    elif mtype == hxa.HXAMetaDataType.HXA_MDT_DOUBLE:
+        size = 8
+    elif mtype == hxa.HXAMetaDataType.HXA_MDT_NODE:
+        size = 4
+    else:
+        size = 1
+    f.seek(length * size, os.SEEK_CUR)
+
+
+def scan_meta(f):
+    offset = f.tell()
+    name = hxa_rw.read_name(f)
+    mtype = hxa_rw.read_u8(f)
+    length = hxa_rw.read_u32(f)
+    f.seek(offset)
+    skip_meta(f)
+
+    return {"name": name, "type": mtype, "length": length, "offset": offset}
+
+
+def scan_layerstack(f, count):
+    layers = []
+    for _ in range(hxa_rw.read_u32(f)):
+        offset = f.tell()
+        name = hxa_rw.read_name(f)
+        components = hxa_rw.read_u8(f)
+        dtype = hxa.HXALayerDataType(hxa_rw.read_u8(f))
+        typecode = hxa_rw.LAYER_TYPECODE[dtype]
+        f.seek(count * components * hxa_rw.ITEMSIZE[typecode], os.SEEK_CUR)
+
+        layers.append(
+            {
+                "name": name,
+                "components": components,
+                "type": int(dtype),
+                "offset": offset,
+            }
+        )
+
+    return {"count": count, "layers": layers}
+
+
+def scan_node(f):
+    node = {}
+    node["offset"] = f.tell()
+    node["type"] = hxa_rw.read_u8(f)
+    meta_data_count = hxa_rw.read_u32(f)
+    node["metas"] = [scan_meta(f) for _ in range(meta_data_count)]
+
+    stacks = {}
+    if node["type"] == hxa.HXANodeType.HXA_NT_GEOMETRY:
+        vertex_count = hxa_rw.read_u32(f)
+        stacks["vertex_stack"] = scan_layerstack(f, vertex_count)
+
+        edge_corner_count = hxa_rw.read_u32(f)
+        stacks["corner_stack"] = scan_layerstack(f, edge_corner_count)
+        stacks["edge_stack"] = scan_layerstack(f, edge_corner_count)
+
+        face_count = hxa_rw.read_u32(f)
+        stacks["face_stack"] = scan_layerstack(f, face_count)
+
+    elif node["type"] == hxa.HXANodeType.HXA_NT_IMAGE:
+        image = hxa.HXANode(node["type"])
+        hxa_rw.read_image_header(f, image)
+        node["image_type"] = int(image.image_type)
+        node["resolution"] = image.resolution
+        stacks["image_stack"] = scan_layerstack(f, image.pixel_count)
+
+    node["stacks"] = stacks
+    return node
+
+
+def scan_toc(f):
+    magic = f.read(4)
+    if magic != b"HxA\0":
+        raise RuntimeError("HXA Error: not a HxA file(incorrect magic number)")
+
+    toc = {}
+    toc["toc_version"] = TOC_VERSION
+    toc["version"] = hxa_rw.read_u8(f)
+    node_count = hxa_rw.read_u32(f)
+    toc["nodes"] = [scan_node(f) for _ in range(node_count)]
+
+    return toc
+
+
+def layer_range(stack, layer):
+    """Return the [start, end) byte range of a layer(header included) of a TOC stack"""
+    typecode = hxa_rw.LAYER_TYPECODE[layer["type"]]
+    start = layer["offset"]
+    data = stack["count"] * layer["components"] * hxa_rw.ITEMSIZE[typecode]
+    return start, start + hxa_rw.name_size(layer["name"]) + 2 + data
+
+
+# *** Scan functions (end)
+
+
+# *** Cache functions (start)
+
+
+def file_key(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def load_toc(path, cache=True):
+    """
+    Return the TOC of the HxA file at path, from its sidecar cache if that's still
+    current, scanning the file(and refreshing the cache) otherwise.
+    """
+    key = file_key(path)
+    toc_path = path + TOC_SUFFIX
+
+    if cache:
+        try:
+            with open(toc_path, "r") as tf:
+                toc = json.load(tf)
+            if toc.get("toc_version") == TOC_VERSION and toc.get("key") == key:
+                return toc
+        except (OSError, ValueError):
+            pass
+
+    with open(path, "rb") as f:
+        toc = scan_toc(f)
+    toc["key"] = key
+
+    if cache:
+        try:
+            with open(toc_path, "w") as tf:
+                json.dump(toc, tf)
+        except OSError:
+            log.debug(f"Couldn't write TOC cache {toc_path}")
+
+    return toc
+
+
+# *** Cache functions (end)
+
+
+# *** Random access functions (start)
+
+
+def read_node_at(path, index, toc=None):
+    """Read node number index of the file at path, seeking straight to it"""
+    toc = toc or load_toc(path)
+    with open(path, "rb") as f:
+        f.seek(toc["nodes"][index]["offset"])
+        return hxa_rw.read_node(f)
+
+
+def read_layer(path, node, stack, name, toc=None):
+    """Read one layer(by stack and layer name) of node number node of the file at path"""
+    toc = toc or load_toc(path)
+    layerstack = toc["nodes"][node]["stacks"][stack]
+    for layer in layerstack["layers"]:
+        if layer["name"] == name:
+            with open(path, "rb") as f:
+                f.seek(layer["offset"])
+                return hxa_rw.read_layer(f, layerstack["count"])
+
+    raise KeyError(f"HXA Error: node {node} has no layer {name} in its {stack}")
+
+
+# *** Random access functions (end)
@@ -0,0 +1,157 @@
+from . import hxapy_util as hxa_util
+
+import array
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger(__name__)
+
+
+# Mesh topology from a reference layer. Every corner stands for the edge from its
+# vertex to the next corner's vertex in the same face. Corners are grouped by their
+# undirected edge (min vertex, max vertex) with one stable sort of the edge keys,
+# which gives, in O(n log n):
+# - the unique edges, sorted by (min vertex, max vertex), and the edge of every corner
+# - the neighbour layer(HXA_CONVENTION_HARD_EDGE_NEIGHBOUR_LAYER_NAME): for every
+#   corner, the corner on the other face sharing its edge, -1 on boundary edges and
+#   on edges shared by more than two faces
+# - edge to face adjacency, as CSR(edge_face_offsets, edge_faces)
+# Without numpy a dict based pass gives the same results.
+
+
+def corner_edges(offsets, sizes, corners):
+    """Return the (from, to) vertex of every corner's edge"""
+    if np is not None:
+        following = np.arange(1, len(corners) + 1)
+        following[offsets + sizes - 1] = offsets
+        return corners, corners[following]
+
+    following = array.array("i", range(1, len(corners) + 1))
+    for o, s in zip(offsets, sizes):
+        following[o + s - 1] = o
+    return corners, array.array("i", (corners[c] for c in following))
+
+
+def build_topology(references, count=None):
+    """
+    Build the topology of the first count(all by default) references. Returns a dict
+    with "edges"(an (n, 2) table, see hxa_util.as_rows), "corner_edge", "neighbour",
+    "edge_face_offsets", "edge_faces" and "face_count".
+    """
+    offsets, sizes, corners = hxa_util.decode_faces(references, count)
+    a, b = corner_edges(offsets, sizes, corners)
+    if np is not None:
+        topology = group_edges_numpy(a, b, sizes)
+    else:
+        topology = group_edges_python(a, b, sizes)
+    topology["face_count"] = len(sizes)
+    return topology
+
+
+def group_edges_numpy(a, b, sizes):
+    corner_count = len(a)
+    lo = np.minimum(a, b).astype(np.int64)
+    hi = np.maximum(a, b).astype(np.int64)
+    keys = (lo << 32) | hi
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first = np.ones(corner_count, dtype=bool)
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    starts = np.flatnonzero(first)
+    group_sizes = np.diff(np.append(starts, corner_count))
+
+    corner_edge = np.empty(corner_count, dtype=np.int32)
+    corner_edge[order] = np.cumsum(first) - 1
+
+    # edges with exactly two corners are the ones with a neighbour
+    neighbour = np.full(corner_count, -1, dtype=np.int32)
+    pairs = starts[group_sizes == 2]
+    neighbour[order[pairs]] = order[pairs + 1]
+    neighbour[order[pairs + 1]] = order[pairs]
+
+    edge_corners = order[starts]
+    edges = np.stack([lo[edge_corners], hi[edge_corners]], axis=1).astype(np.int32)
+    faces = np.repeat(np.arange(len(sizes), dtype=np.int32), sizes)
+
+    return {
+        "edges": edges,
+        "corner_edge": corner_edge,
+        "neighbour": neighbour,
+        "edge_face_offsets": starts.astype(np.int32),
+        "edge_faces": faces[order],
+    }
+
+
+def group_edges_python(a, b, sizes):
+    faces = array.array("i")
+    for f, size in enumerate(sizes):
+        faces.extend([f] * size)
+
+    groups = {}
+    for c in range(len(a)):
+        key = (a[c], b[c]) if a[c] <= b[c] else (b[c], a[c])
+        groups.setdefault(key, []).append(c)
+
+    edges = array.array("i")
+    corner_edge = array.array("i", bytes(4 * len(a)))
+    neighbour = array.array("i", [-1]) * len(a)
+    edge_face_offsets = array.array("i")
+    edge_faces = array.array("i")
+    for e, key in enumerate(sorted(groups)):
+        group = groups[key]
+        edges.extend(key)
+        edge_face_offsets.append(len(edge_faces))
+        for c in group:
+            corner_edge[c] = e
+            edge_faces.append(faces[c])
+        if len(group) == 2:
+            neighbour[group[0]] = group[1]
+            neighbour[group[1]] = group[0]
+
+    return {
+        "edges": hxa_util.as_rows(edges, 2),
+        "corner_edge": corner_edge,
+        "neighbour": neighbour,
+        "edge_face_offsets": edge_face_offsets,
+        "edge_faces": edge_faces,
+    }
+
+
+def edge_face_list(topology, edge):
+    """The faces adjacent to one edge"""
+    offsets = topology["edge_face_offsets"]
+    start = offsets[edge]
+    if edge + 1 < len(offsets):
+        end = offsets[edge + 1]
+    else:
+        end = len(topology["edge_faces"])
+    return topology["edge_faces"][start:end]
+
+
+def merge_edges(edges, extra):
+    """
+    The edges table followed by the rows of extra(a flat list of vertex pairs) that
+    aren't already in it, in either orientation. Used for loose edges, which the
+    reference layer can't hold.
+    """
+    if np is not None:
+        extra = np.sort(np.asarray(extra, dtype=np.int64).reshape(-1, 2), axis=1)
+        keys = (edges[:, 0].astype(np.int64) << 32) | edges[:, 1]
+        extra_keys = (extra[:, 0] << 32) | extra[:, 1]
+        _, first = np.unique(extra_keys, return_index=True)
+        loose = np.sort(first[~np.isin(extra_keys[first], keys)])
+        return np.concatenate([edges, extra[loose].astype(np.int32)])
+
+    present = set(map(tuple, edges.tolist()))
+    merged = hxa_util.flatten(edges.tolist(), "i")
+    for a, b in hxa_util.as_rows(extra, 2, typecode="q").tolist():
+        key = (a, b) if a <= b else (b, a)
+        if key not in present:
+            present.add(key)
+            merged.extend(key)
+    return hxa_util.as_rows(merged, 2)
@@ -1,5 +1,13 @@
 from datetime import datetime
 
+import array
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 def timestamp():
     return datetime.now().strftime("%d%m%y-%H%M%S")
@@ -22,27 +30,237 @@ def time_elapsed(start, end):
         return f"Done in: {s}s"
 
 
-def flatten_list(_list):
-    res = []
-    for inner in _list:
-        for el in inner:
-            res.append(el)
-    return res
+def new_array(typecode, length):
+    """A zeroed array of length items: a numpy array if numpy is available"""
+    if np is not None:
+        return np.zeros(length, typecode)
+    return array.array(typecode, bytes(length * array.array(typecode).itemsize))
 
 
-def restore_faces(references):
-    faces = []
-    tupl = []
-    for r in references:
+# *** Reshape functions (start)
+
+
+def as_rows(data, k, count=None, typecode="d"):
+    """
+    View the first count(all by default) rows of k items of a flat buffer as a table,
+    without copying: an (n, k) numpy array, or a 2D memoryview without numpy.
+    Lists and tuples are packed into a typecode array first.
+    """
+    if isinstance(data, (list, tuple)):
+        data = array.array(typecode, data)
+    length = None if count is None else count * k
+
+    if np is not None:
+        return np.asarray(data)[:length].reshape(-1, k)
+
+    mv = memoryview(data)[:length]
+    if len(mv) < k:
+        return mv  # memoryviews can't have a 0 in their shape
+    return mv.cast("B").cast(mv.format, (len(mv) // k, k))
+
+
+def flatten(rows, typecode):
+    """
+    Flatten rows(a sequence of sequences, or a table from as_rows) into one typecode
+    array, in a single bulk pass
+    """
+    if np is not None:
+        if isinstance(rows, np.ndarray):
+            return np.ascontiguousarray(rows, typecode).ravel()
+        return np.fromiter(itertools.chain.from_iterable(rows), typecode)
+
+    if isinstance(rows, memoryview):
+        return array.array(typecode, rows.cast("B").cast(rows.format))
+    return array.array(typecode, itertools.chain.from_iterable(rows))
+
+
+def as_buffer(data, typecode):
+    """
+    data(a flat buffer or sequence) as one contiguous typecode buffer, the way
+    foreach_set takes it. Only copied when it isn't one already.
+    """
+    if np is not None:
+        return np.ascontiguousarray(data, typecode).reshape(-1)
+    if isinstance(data, array.array) and data.typecode == typecode:
+        return data
+    if isinstance(data, memoryview):
+        data = data.cast("B").cast(data.format)
+    return array.array(typecode, data)
+
+
+# *** Reshape functions (end)
+
+
+# *** Face functions (start)
+
+# Faces are stored in the reference layer as one stream of vertex indexes, with the
+# last corner of every face stored as -r-1. decode_faces turns it into CSR arrays:
+# the first corner(offsets) and the corner count(sizes) of every face, plus every
+# corner's vertex index(corners); encode_faces does the reverse. Both are vectorized
+# with numpy when it's available and return array.arrays otherwise.
+
+
+def decode_faces(references, count=None):
+    """
+    Decode the first count(all by default) references into (offsets, sizes, corners).
+    Corners after the last face's end marker aren't part of a face and are dropped.
+    """
+    if count is None:
+        count = len(references)
+
+    if np is not None:
+        refs = np.asarray(references, dtype=np.int32)[:count]
+        ends = np.flatnonzero(refs < 0)
+        end = ends[-1] + 1 if len(ends) else 0
+        # ~r == -r - 1, r >> 31 is -1 for the end markers and 0 otherwise
+        corners = np.bitwise_xor(refs[:end], refs[:end] >> 31)
+        sizes = np.diff(ends, prepend=-1).astype(np.int32)
+        offsets = (ends + 1 - sizes).astype(np.int32)
+        return offsets, sizes, corners
+
+    offsets = array.array("i")
+    sizes = array.array("i")
+    corners = array.array("i")
+    start = 0
+    for i in range(count):
+        r = references[i]
         if r < 0:
-            r = -r - 1
-            tupl.append(r)
-            faces.append(tuple(tupl))
-            tupl = []
-        else:
-            tupl.append(r)
-    return faces
+            offsets.append(start)
+            sizes.append(i + 1 - start)
+            start = i + 1
+            r = ~r
+        corners.append(r)
+    del corners[start:]
+    return offsets, sizes, corners
+
+
+def encode_faces(sizes, corners):
+    """Encode face sizes and corner vertex indexes into a reference layer(int32)"""
+    if np is not None:
+        references = np.array(corners, dtype=np.int32)
+        ends = np.cumsum(np.asarray(sizes, dtype=np.intp)) - 1
+        references[ends] = ~references[ends]
+        return references
+
+    references = array.array("i", corners)
+    end = -1
+    for size in sizes:
+        end += size
+        references[end] = ~references[end]
+    return references
+
+
+def gather_corners(offsets, sizes, corners):
+    """
+    The corners of every face(starting at offsets, sizes long) in face order, as
+    encode_faces expects them. corners is returned as is when the faces are already
+    stored back to back, which is the common case.
+    """
+    if np is not None:
+        offsets = np.asarray(offsets, dtype=np.intp)
+        sizes = np.asarray(sizes, dtype=np.intp)
+        starts = np.cumsum(sizes) - sizes
+        if np.array_equal(offsets, starts):
+            return corners
+        index = np.repeat(offsets - starts, sizes) + np.arange(starts[-1] + sizes[-1])
+        return np.asarray(corners)[index]
+
+    start = 0
+    for o, s in zip(offsets, sizes):
+        if o != start:
+            break
+        start += s
+    else:
+        return corners
+    gathered = array.array("i")
+    for o, s in zip(offsets, sizes):
+        gathered.extend(corners[o : o + s])
+    return gathered
+
+
+# face stack layer of triangulated exports: the original face of every triangle
+SOURCE_FACE_LAYER_NAME = "source_face"
+
+
+def triangulate(references, count=None):
+    """
+    Fan triangulate the faces of the first count(all by default) references. Returns
+    (triangles, source_faces): an (n, 3) table(see as_rows) of vertex indexes and the
+    index of the face every triangle came from. Faces with less than 3 corners make no
+    triangles.
+    """
+    offsets, sizes, corners = decode_faces(references, count)
+
+    if np is not None:
+        triangle_counts = np.maximum(sizes - 2, 0)
+        source_faces = np.repeat(
+            np.arange(len(sizes), dtype=np.int32), triangle_counts
+        )
+        # position of every triangle in its fan: 1 .. size - 2
+        first = np.cumsum(triangle_counts) - triangle_counts
+        fan = np.arange(len(source_faces)) - np.repeat(first, triangle_counts) + 1
+        base = offsets[source_faces]
+        triangles = corners[np.stack([base, base + fan, base + fan + 1], axis=1)]
+        return triangles, source_faces
+
+    triangles = array.array("i")
+    source_faces = array.array("i")
+    for f, (o, s) in enumerate(zip(offsets, sizes)):
+        for i in range(1, s - 1):
+            triangles.extend((corners[o], corners[o + i], corners[o + i + 1]))
+            source_faces.append(f)
+    return as_rows(triangles, 3), source_faces
+
+
+def encode_triangles(triangles):
+    """Encode an (n, 3) table of triangles into a reference layer(int32)"""
+    if np is not None:
+        references = np.array(triangles, dtype=np.int32).reshape(-1)
+        references[2::3] = ~references[2::3]
+        return references
+
+    references = flatten(triangles, "i")
+    references[2::3] = array.array("i", (~r for r in references[2::3]))
+    return references
+
+
+def restore_faces(references):
+    """The faces of a reference layer, as a list of vertex index tuples"""
+    offsets, sizes, corners = decode_faces(references)
+    corners = corners.tolist()
+    return [
+        tuple(corners[o : o + s]) for o, s in zip(offsets.tolist(), sizes.tolist())
+    ]
+
+
+# *** Face functions (end)
+
+
+# *** Weight functions (start)
+
+
+def group_by_weight(indexes, weights):
+    """
+    Bucket the vertex indexes of a vertex group by their weight, yielding
+    (weight, [indexes]) once per distinct weight, in order of increasing weight.
+    Each bucket is a single VertexGroup.add call.
+    """
+    count = min(len(indexes), len(weights))
+    if np is not None:
+        weights = np.asarray(weights)[:count]
+        indexes = np.asarray(indexes)[:count]
+        order = np.argsort(weights, kind="stable")
+        values, starts = np.unique(weights[order], return_index=True)
+        buckets = np.split(indexes[order], starts[1:])
+        for weight, bucket in zip(values.tolist(), buckets):
+            yield weight, bucket.tolist()
+        return
+
+    buckets = {}
+    for i in range(count):
+        buckets.setdefault(weights[i], []).append(indexes[i])
+    for weight in sorted(buckets):
+        yield weight, buckets[weight]
 
 
-def break_list_up(data, length, step):
-    return [tuple(data[x : x + step]) for x in list(range(0, length, step))]
+# *** Weight functions (end)
@@ -1,144 +1,706 @@
 from . import hxapy_header as hxa
 from . import hxapy_read_write as hxa_rw
+from . import hxapy_toc as hxa_toc
+from . import hxapy_compress as hxa_z
 
+import os
+import sys
+import lzma
+import zlib
+import array
+import struct
 import logging
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 log = logging.getLogger(__name__)
 
 
-def hxa_util_validate_meta(meta, node, count):
-    if meta["type"] == hxa.HXAMetaDataType.HXA_MDT_NODE:
-        for al in range(len(meta["data"])):
-            if meta["data"][al] >= count:
-                log.info(
-                    f"HxA Verify Error: Node {node} has meta data {meta['name']} that is referencing a non \
-                        existent node ({meta['data'][al]} out of {count})\n"
-                )
-                return False
-    if meta["type"] == hxa.HXAMetaDataType.HXA_MDT_META:
-        for al in range(len(meta["data"])):
-            hxa_util_validate_meta(
-                meta["data"][al],
-                node,
-                count,
+class HXAValidationError(RuntimeError):
+    """Raised when a HxA file doesn't pass validation, with where it failed"""
+
+    def __init__(self, message, node=None, layer=None, offset=None):
+        super().__init__(format_violation(violation(message, node, layer, offset)))
+        self.node = node
+        self.layer = layer
+        self.offset = offset
+
+    @classmethod
+    def from_violation(cls, v):
+        return cls(v["message"], v["node"], v["layer"], v["offset"])
+
+
+# Validation runs at one of three levels:
+# - header:    the magic number, version and node count, in constant time
+# - structure: counts, types and names of every node and layer, from the TOC(see
+#              hxapy_toc), without reading any layer data
+# - deep:      structure, plus the data itself(meta node references, reference layers)
+# and returns a report listing every violation with its node, layer and file offset.
+
+LEVEL_HEADER = "header"
+LEVEL_STRUCTURE = "structure"
+LEVEL_DEEP = "deep"
+LEVELS = (LEVEL_HEADER, LEVEL_STRUCTURE, LEVEL_DEEP)
+
+# smallest possible node: u8 type, u32 meta count
+NODE_MIN_SIZE = 5
+
+NODE_TYPES = {t.value for t in hxa.HXANodeType}
+FLOAT_TYPES = (hxa.HXALayerDataType.HXA_LDT_FLOAT, hxa.HXALayerDataType.HXA_LDT_DOUBLE)
+
+STACK_COUNT = {
+    "vertex_stack": "vertex_count",
+    "corner_stack": "edge_corner_count",
+    "edge_stack": "edge_corner_count",
+    "face_stack": "face_count",
+    "image_stack": "pixel_count",
+}
+
+
+def violation(message, node=None, layer=None, offset=None):
+    return {"node": node, "layer": layer, "offset": offset, "message": message}
+
+
+def format_violation(v):
+    where = []
+    if v["node"] is not None:
+        where.append(f"node {v['node']}")
+    if v["layer"] is not None:
+        where.append(f"layer {v['layer']}")
+    if v["offset"] is not None:
+        where.append(f"offset {v['offset']}")
+    return f"{', '.join(where)}: {v['message']}" if where else v["message"]
+
+
+# *** Check functions (start)
+
+
+def check_header(header, size):
+    """Check the first 9 bytes of a file of size bytes"""
+    if len(header) < hxa_rw.HEADER.size:
+        return [violation(f"file is too short({size} bytes) for a header", offset=0)]
+
+    magic, version, node_count = hxa_rw.HEADER.unpack_from(header)
+    errors = []
+    if magic != b"HxA\0":
+        errors.append(violation("incorrect magic number", offset=0))
+    if version > hxa.HXA_VERSION_FORMAT:
+        errors.append(
+            violation(
+                f"format version {version} is newer than {hxa.HXA_VERSION_FORMAT}",
+                offset=4,
+            )
+        )
+    if hxa_rw.HEADER.size + node_count * NODE_MIN_SIZE > size:
+        errors.append(
+            violation(
+                f"{node_count} nodes can't fit into a file of {size} bytes", offset=5
             )
+        )
+    return errors
 
 
-def hxa_util_validate(hxa_file):
-    for nc in range(hxa_file["node_count"]):
-        node = hxa_file["nodes"][nc]
-        for mc in range(node["meta_data_count"]):
-            hxa_util_validate_meta(
-                node["meta_data"][mc],
-                mc,
-                hxa_file["node_count"],
+def check_layer(nc, layer, name, components, types):
+    """Check a base layer's(vertex, reference) name, components and type"""
+    errors = []
+    if layer["name"] != name:
+        errors.append(f"is named {layer['name']}, must be {name}")
+    if layer["components"] != components:
+        errors.append(f"has {layer['components']} components, must be {components}")
+    if layer["type"] not in types:
+        names = " or ".join(hxa.HXALayerDataType(t).name for t in types)
+        errors.append(
+            f"is {hxa.HXALayerDataType(layer['type']).name}, must be {names}"
+        )
+    return [
+        violation(f"{name} layer {e}", nc, layer["name"], layer["offset"])
+        for e in errors
+    ]
+
+
+def check_structure(toc_node, nc, size=None):
+    """
+    Check a node's outline(a TOC node, see hxapy_toc, or node_outline()), and that
+    its layers fit into a file of size bytes when the size is given.
+    """
+    errors = []
+    if toc_node["type"] not in NODE_TYPES:
+        return [
+            violation(
+                f"unknown node type {toc_node['type']}", nc, offset=toc_node["offset"]
             )
+        ]
 
-        node_type = hxa.HXANodeType(node["type"]).value
-        if node_type == hxa.HXANodeType.HXA_NT_GEOMETRY:
-            if node["content"]["vertex_stack"]["layer_count"] == 0:
-                log.info(f"HxA Verify Error: Node {nc} has no vertex layer\n")
-                return False
-            components = node["content"]["vertex_stack"]["layers"][0]["components"]
-            if components != 3:
-                log.info(
-                    f"HxA Verify Error: Node {mc} vertex layer vertex layer has {components} components. \
-                        Must be HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_COMPONENTS \
-                        {hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_COMPONENTS}.\n"
-                )
-                return False
-
-            layer_type = hxa.HXALayerDataType(
-                node["content"]["vertex_stack"]["layers"][0]["type"]
-            ).value
-            if (layer_type != hxa.HXALayerDataType.HXA_LDT_FLOAT) and (
-                layer_type != hxa.HXALayerDataType.HXA_LDT_DOUBLE
-            ):
-                log.info(
-                    f"HxA Verify Error: Node {nc} first vertex layer is {hxa.HXALayerDataType(layer_type).name}, \
-                        must be HXA_LDT_FLOAT or HXA_LDT_DOUBLE\n"
-                )
-                return False
-
-            name = node["content"]["vertex_stack"]["layers"][0]["name"]
-            if name != hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME:
-                log.info(
-                    f'HxA Verify Error: Node {nc} vertex layer is named {name}. \
-                        Must be HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME " \
-                        {hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME}".\n'
-                )
-                return False
+    stacks = toc_node["stacks"]
+    if toc_node["type"] == hxa.HXANodeType.HXA_NT_GEOMETRY:
+        vertex_layers = stacks["vertex_stack"]["layers"]
+        if not vertex_layers:
+            errors.append(violation("no vertex layer", nc, offset=toc_node["offset"]))
+        else:
+            errors += check_layer(
+                nc,
+                vertex_layers[0],
+                hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_NAME,
+                hxa.HXA_CONVENTION_HARD_BASE_VERTEX_LAYER_COMPONENTS,
+                FLOAT_TYPES,
+            )
 
-            if node["content"]["corner_stack"]["layer_count"] != 0:
-                components = node["content"]["corner_stack"]["layers"][0]["components"]
-                if components != 1:
-                    log.info(
-                        f"HxA Verify Error: Node {nc} reference layer has {components} components. Must be 1.\n"
-                    )
-                    return False
-
-                layer_type = hxa.HXALayerDataType(
-                    node["content"]["corner_stack"]["layers"][0]["type"]
-                ).value
-                if layer_type != hxa.HXALayerDataType.HXA_LDT_INT32:
-                    log.info(
-                        f"HxA Verify Error: Node {nc} reference layer is of type {hxa.HXALayerDataType(layer_type).value} \
-                            must be HXA_LDT_INT32\n"
-                    )
-                    return False
-
-                name = node["content"]["corner_stack"]["layers"][0]["name"]
-                if name != hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME:
-                    log.info(
-                        f'HxA Verify Error: Node {nc} reference layer is named {name}. Must be \
-                            HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME " \
-                            {hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME}".\n'
-                    )
-                    return False
-
-                references = node["content"]["corner_stack"]["layers"][0]["data"]
-                poly_count = 0
-                reference = 0
-                # Q: what if edge_corner_count is 0??
-                for cc in range(node["content"]["edge_corner_count"]):
-                    if references[cc] < 0:
-                        reference = -references[cc] - 1
-                        poly_count += 1
-                    else:
-                        reference = references[cc]
-
-                    if reference >= node["content"]["vertex_count"]:
-                        log.info(
-                            f"HxA Verify Error: Node {nc} has a reference value referencing a non existing \
-                                vertex ({reference}).\n"
+        corner_layers = stacks["corner_stack"]["layers"]
+        if corner_layers:
+            errors += check_layer(
+                nc,
+                corner_layers[0],
+                hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_NAME,
+                hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_COMPONENTS,
+                (hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_TYPE,),
+            )
+
+    if size is not None:
+        for stack in stacks.values():
+            for layer in stack["layers"]:
+                _, end = hxa_toc.layer_range(stack, layer)
+                if end > size:
+                    errors.append(
+                        violation(
+                            f"layer data ends at {end}, past the end of the file",
+                            nc,
+                            layer["name"],
+                            layer["offset"],
                         )
-                        return False
+                    )
+
+    return errors
 
-                face_count = node["content"]["face_count"]
-                if face_count != poly_count:
-                    log.info(
-                        f"HxA Verify Error: Node {nc} claims to have {face_count} faces but the reference data \
-                            has {poly_count} faces.\n"
+
+def check_meta(meta, nc, node_count, offset=None):
+    """Check the node references of a meta and(recursively) of its children"""
+    errors = []
+    if meta.type == hxa.HXAMetaDataType.HXA_MDT_NODE:
+        for reference in hxa_rw.ensure_array(meta.data):
+            if reference >= node_count:
+                errors.append(
+                    violation(
+                        f"meta data {meta.name} references a non existent node "
+                        f"({reference} out of {node_count})",
+                        nc,
+                        offset=offset,
                     )
-                    return False
+                )
+    elif meta.type == hxa.HXAMetaDataType.HXA_MDT_META:
+        for child in meta.data:
+            errors += check_meta(child, nc, node_count, offset)
+    return errors
+
+
+def check_references(references, count, vertex_count, use_numpy=None):
+    """
+    Check the first count entries of a reference layer against vertex_count. Returns
+    (polygon count, index of the first reference out of bounds or None, whether the
+    last corner ends a polygon). Uses numpy when it's available, both paths give the
+    same results.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if count == 0:
+        return 0, None, True
+
+    if use_numpy:
+        refs = np.asarray(references)[:count]
+        # ~r == -r - 1, without overflowing on the smallest int32
+        decoded = np.where(refs < 0, ~refs, refs)
+        out_of_bounds = decoded >= vertex_count
+        bad = int(out_of_bounds.argmax()) if out_of_bounds.any() else None
+        poly_count = int(np.count_nonzero(refs < 0))
+        terminated = bool(refs[count - 1] < 0)
+        return poly_count, bad, terminated
+
+    poly_count = 0
+    bad = None
+    for cc in range(count):
+        reference = references[cc]
+        if reference < 0:
+            reference = ~reference
+            poly_count += 1
+        if bad is None and reference >= vertex_count:
+            bad = cc
+    terminated = references[count - 1] < 0
+    return poly_count, bad, terminated
+
+
+def check_data(node, nc, node_count, toc_node=None):
+    """Check the data of a node: meta node references and the reference layer"""
+    errors = []
+    for mc, meta in enumerate(node.meta_data):
+        offset = toc_node["metas"][mc]["offset"] if toc_node else None
+        errors += check_meta(meta, nc, node_count, offset)
+
+    if node.type != hxa.HXANodeType.HXA_NT_GEOMETRY or not node.corner_stack.layers:
+        return errors
+
+    layer = node.corner_stack.layers[0]
+    if layer.type != hxa.HXA_CONVENTION_HARD_BASE_CORNER_LAYER_TYPE:
+        return errors  # reported by check_structure
+
+    data_offset = None
+    if toc_node:
+        layer_offset = toc_node["stacks"]["corner_stack"]["layers"][0]["offset"]
+        data_offset = layer_offset + hxa_rw.name_size(layer.name) + 2
+
+    def corner_offset(cc):
+        return None if data_offset is None else data_offset + cc * 4
+
+    poly_count, bad, terminated = check_references(
+        layer.data, node.edge_corner_count, node.vertex_count
+    )
+    if bad is not None:
+        reference = layer.data[bad]
+        errors.append(
+            violation(
+                f"reference {bad} references a non existing vertex "
+                f"({~reference if reference < 0 else reference} out of "
+                f"{node.vertex_count})",
+                nc,
+                layer.name,
+                corner_offset(bad),
+            )
+        )
+    if not terminated:
+        errors.append(
+            violation(
+                "the last reference doesn't end a polygon(isn't negative)",
+                nc,
+                layer.name,
+                corner_offset(node.edge_corner_count - 1),
+            )
+        )
+    if node.face_count != poly_count:
+        errors.append(
+            violation(
+                f"node claims to have {node.face_count} faces but the reference data "
+                f"has {poly_count}",
+                nc,
+                layer.name,
+                data_offset,
+            )
+        )
+    return errors
+
+
+def node_outline(node):
+    """The TOC entry(without offsets) of an in memory node, for check_structure()"""
+    stacks = {}
+    for name, stack in node.stacks():
+        stacks[name] = {
+            "count": getattr(node, STACK_COUNT[name]),
+            "layers": [
+                {
+                    "name": layer.name,
+                    "components": layer.components,
+                    "type": layer.type,
+                    "offset": None,
+                }
+                for layer in stack.layers
+            ],
+        }
+    return {"type": node.type, "offset": None, "stacks": stacks}
+
+
+# *** Check functions (end)
+
+
+def validate_hxa(hxa_file):
+    """Structure and data checks of an in memory HXAFile, returning the violations"""
+    hxa_file = hxa.HXAFile.from_dict(hxa_file)
+    errors = []
+    for nc, node in enumerate(hxa_file.nodes):
+        errors += check_structure(node_outline(node), nc)
+        errors += check_data(node, nc, hxa_file.node_count)
+    return errors
+
+
+# *** Parallel node check functions (start)
+
+# Deep checks of a file's nodes are independent of each other, so they can run in a
+# process pool. Every worker maps the file once(sharing the OS page cache) and gets
+# (node index, TOC node) tasks; it parses the node at its TOC offset as views into the
+# mapping and returns its violations. Results come back in node order, so the report
+# is the same as a sequential run's.
+
+worker_buffer = None
+
+
+def init_node_worker(path):
+    global worker_buffer
+    with open(path, "rb") as f:
+        worker_buffer = memoryview(hxa_rw.map_file(f))
+
+
+def check_node_at(mv, nc, toc_node, node_count):
+    """Parse the node at its TOC offset in mv and return its check_data violations"""
+    try:
+        node, _ = hxa_rw.unpack_node(mv, toc_node["offset"], False)
+    except (EOFError, IndexError, KeyError, ValueError, struct.error) as e:
+        return [violation(f"node couldn't be read: {e}", nc, offset=toc_node["offset"])]
+    return check_data(node, nc, node_count, toc_node)
 
-    return True
+
+def check_node_task(task):
+    nc, toc_node, node_count = task
+    return check_node_at(worker_buffer, nc, toc_node, node_count)
+
+
+def check_nodes(path, toc, workers=1, skip=()):
+    """
+    Deep checks of every node in toc but the skip ones, in a pool of processes if
+    workers > 1. The file is mapped here, or by each worker, never by both.
+    """
+    node_count = len(toc["nodes"])
+    tasks = [
+        (nc, toc_node, node_count)
+        for nc, toc_node in enumerate(toc["nodes"])
+        if nc not in skip
+    ]
+    workers = workers or os.cpu_count()
+
+    errors = []
+    if workers == 1 or len(tasks) < 2:
+        with open(path, "rb") as f:
+            buf = hxa_rw.map_file(f)
+        try:
+            for task in tasks:
+                errors += check_node_at(memoryview(buf), *task)
+        finally:
+            if buf:
+                try:
+                    buf.close()
+                except BufferError:
+                    pass  # a traceback still holds views into it, it's closed with them
+        return errors
+
+    chunksize = max(1, node_count // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_node_worker, initargs=(path,)
+    ) as executor:
+        for node_errors in executor.map(check_node_task, tasks, chunksize=chunksize):
+            errors += node_errors
+    return errors
+
+
+# *** Parallel node check functions (end)
+
+
+def validate_file(path, level=LEVEL_DEEP, workers=1):
+    """
+    Validate the HxA file at path at the given level. Returns a report dict with the
+    path, level, valid flag and the list of errors(see violation()). The deep checks
+    of the nodes run in a pool of workers processes(all cores with None).
+    """
+    if level not in LEVELS:
+        raise ValueError(f"HXA Error: unknown validation level {level}")
+
+    with open(path, "rb") as f:
+        if hxa_z.is_compressed(f):
+            return validate_container(path, level)
+
+    report = {"path": path, "level": level, "valid": False, "errors": []}
+    errors = report["errors"]
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        errors += check_header(f.read(hxa_rw.HEADER.size), size)
+        if errors or level == LEVEL_HEADER:
+            report["valid"] = not errors
+            return report
+
+        f.seek(0)
+        try:
+            toc = hxa_toc.scan_toc(f)
+        except (EOFError, RuntimeError, ValueError, KeyError, struct.error) as e:
+            errors.append(violation(f"couldn't be parsed: {e}", offset=f.tell()))
+            return report
+
+        # skipped metas are seeked over, so a file cut inside one scans without error
+        if f.tell() > size:
+            errors.append(
+                violation(
+                    f"file is truncated, {f.tell() - size} bytes missing",
+                    len(toc["nodes"]) - 1,
+                    offset=size,
+                )
+            )
+        elif f.tell() < size:
+            errors.append(
+                violation(f"{size - f.tell()} bytes of trailing data", offset=f.tell())
+            )
+        for nc, toc_node in enumerate(toc["nodes"]):
+            errors += check_structure(toc_node, nc, size)
+
+        # nodes with structure violations would only fail again(or not parse at all)
+        if level == LEVEL_DEEP:
+            skip = {e["node"] for e in errors if e["node"] is not None}
+            errors += check_nodes(path, toc, workers, skip)
+
+    report["valid"] = not errors
+    return report
+
+
+def check_chunks(index, base, size):
+    """
+    Check a .hxa.z index: its chunks have to cover the raw file back to back and
+    be stored back to back, ending with the container(base is where they start).
+    """
+    raw_offset = 0
+    offset = 0
+    for i, (chunk_raw_offset, raw_size, chunk_offset, chunk_size) in enumerate(
+        index["chunks"]
+    ):
+        if chunk_raw_offset != raw_offset or chunk_offset != offset:
+            return [violation(f"chunk {i} is out of place", offset=base + offset)]
+        raw_offset += raw_size
+        offset += chunk_size
+
+    errors = []
+    if raw_offset != index["raw_size"]:
+        errors.append(
+            violation(f"chunks hold {raw_offset} of {index['raw_size']} raw bytes")
+        )
+    if base + offset > size:
+        errors.append(
+            violation(
+                f"container is truncated, {base + offset - size} bytes missing",
+                offset=size,
+            )
+        )
+    elif base + offset < size:
+        errors.append(
+            violation(
+                f"{size - base - offset} bytes of trailing data", offset=base + offset
+            )
+        )
+    return errors
+
+
+def validate_container(path, level=LEVEL_DEEP):
+    """
+    validate_file for .hxa.z containers. The header level checks the container
+    index, the structure level the TOC it holds, neither decompresses anything;
+    the deep level decompresses the file and checks it in memory.
+    """
+    report = {"path": path, "level": level, "valid": False, "errors": []}
+    errors = report["errors"]
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as f:
+        try:
+            _, index, base = hxa_z.read_index(f)
+            errors += check_chunks(index, base, size)
+        except (RuntimeError, ValueError, KeyError, TypeError) as e:
+            errors.append(violation(f"container index couldn't be read: {e}", offset=0))
+        if errors or level == LEVEL_HEADER:
+            report["valid"] = not errors
+            return report
+
+        for nc, toc_node in enumerate(index["toc"]["nodes"]):
+            errors += check_structure(toc_node, nc, index["raw_size"])
+        if errors or level == LEVEL_STRUCTURE:
+            report["valid"] = not errors
+            return report
+
+        f.seek(0)
+        try:
+            errors += validate_hxa(hxa_z.read_hxa_z(f))
+        except (
+            EOFError,
+            IndexError,
+            RuntimeError,
+            ValueError,
+            KeyError,
+            struct.error,
+            zlib.error,
+            lzma.LZMAError,
+        ) as e:
+            errors.append(violation(f"couldn't be decompressed and parsed: {e}"))
+
+    report["valid"] = not errors
+    return report
+
+
+# *** Validating read functions (start)
+
+# A reader that validates while it parses: each node is checked(check_structure, then
+# check_data) as soon as it has been read, and the first violation raises an
+# HXAValidationError with its offset. Layers are parsed as views into the buffer and
+# every layer's extent is checked against the buffer size before its data is touched,
+# so a truncated or garbage file fails without reading, or allocating, the rest of it.
+# With copy, the layers are only copied once every node has passed.
+
+
+def unpack_u32_checked(mv, o, nc):
+    if o + 4 > len(mv):
+        raise HXAValidationError("file ends inside a node", nc, offset=o)
+    return hxa_rw.U32.unpack_from(mv, o)[0], o + 4
+
+
+def unpack_layerstack_checked(mv, o, count, nc):
+    layer_count, o = unpack_u32_checked(mv, o, nc)
+
+    layers = []
+    outline = []
+    for _ in range(layer_count):
+        offset = o
+        try:
+            name, o = hxa_rw.unpack_name(mv, o)
+            components, dtype = hxa_rw.LAYER_HEADER.unpack_from(mv, o)
+            dtype = hxa.HXALayerDataType(dtype)
+            typecode = hxa_rw.LAYER_TYPECODE[dtype]
+            data, o = hxa_rw.unpack_array(
+                mv, o + hxa_rw.LAYER_HEADER.size, typecode, count * components, False
+            )
+        except (EOFError, IndexError, ValueError, struct.error) as e:
+            raise HXAValidationError(
+                f"layer couldn't be read: {e}", nc, offset=offset
+            ) from None
+
+        layers.append(hxa.HXALayer(name, components, dtype, data))
+        outline.append(
+            {"name": name, "components": components, "type": dtype, "offset": offset}
+        )
+
+    return hxa.HXALayerStack(layers), {"count": count, "layers": outline}, o
+
+
+def unpack_node_checked(mv, o, nc, node_count, copy):
+    """Parse and check one node, its layers stay views into mv(see copy_layers)"""
+    toc_node = {"offset": o, "metas": [], "stacks": {}}
+    try:
+        node_type, meta_data_count = hxa_rw.META_HEADER.unpack_from(mv, o)
+        o += hxa_rw.META_HEADER.size
+        toc_node["type"] = node_type
+        node_type = hxa.HXANodeType(node_type)
+    except (ValueError, struct.error) as e:
+        raise HXAValidationError(
+            f"node couldn't be read: {e}", nc, offset=toc_node["offset"]
+        ) from None
+
+    meta_data = []
+    for _ in range(meta_data_count):
+        offset = o
+        toc_node["metas"].append({"offset": offset})
+        try:
+            meta, o = hxa_rw.unpack_meta(mv, o, copy)
+        except (EOFError, IndexError, KeyError, ValueError, struct.error) as e:
+            raise HXAValidationError(
+                f"meta data couldn't be read: {e}", nc, offset=offset
+            ) from None
+        meta_data.append(meta)
+
+    node = hxa.HXANode(node_type, meta_data)
+    stacks = toc_node["stacks"]
+    if node_type == hxa.HXANodeType.HXA_NT_GEOMETRY:
+        node.vertex_count, o = unpack_u32_checked(mv, o, nc)
+        node.vertex_stack, stacks["vertex_stack"], o = unpack_layerstack_checked(
+            mv, o, node.vertex_count, nc
+        )
+
+        node.edge_corner_count, o = unpack_u32_checked(mv, o, nc)
+        node.corner_stack, stacks["corner_stack"], o = unpack_layerstack_checked(
+            mv, o, node.edge_corner_count, nc
+        )
+        node.edge_stack, stacks["edge_stack"], o = unpack_layerstack_checked(
+            mv, o, node.edge_corner_count, nc
+        )
+
+        node.face_count, o = unpack_u32_checked(mv, o, nc)
+        node.face_stack, stacks["face_stack"], o = unpack_layerstack_checked(
+            mv, o, node.face_count, nc
+        )
+
+    elif node_type == hxa.HXANodeType.HXA_NT_IMAGE:
+        try:
+            node.image_type = hxa.HXAImageType(mv[o])
+        except (IndexError, ValueError) as e:
+            raise HXAValidationError(
+                f"image header couldn't be read: {e}", nc, offset=o
+            ) from None
+        o += 1
+        for i in range(node.image_dimensions):
+            node.resolution[i], o = unpack_u32_checked(mv, o, nc)
+        node.image_stack, stacks["image_stack"], o = unpack_layerstack_checked(
+            mv, o, node.pixel_count, nc
+        )
+
+    errors = check_structure(toc_node, nc) or check_data(node, nc, node_count, toc_node)
+    if errors:
+        raise HXAValidationError.from_violation(errors[0])
+
+    return node, o
+
+
+def copy_layers(node):
+    """Replace the layer views of a node by arrays of their own"""
+    for _, stack in node.stacks():
+        for layer in stack.layers:
+            data = array.array(layer.data.format)
+            data.frombytes(layer.data.cast("B"))
+            layer.data = data
+
+
+def read_hxa_validated(buf, copy=True):
+    """
+    Parse and validate a HxA file held in one buffer(bytes, mmap, ...) in a single
+    pass, like read_hxa_buffer followed by a deep validation. Raises an
+    HXAValidationError, carrying the node, layer and offset, at the first violation.
+    """
+    mv = memoryview(buf)
+    errors = check_header(bytes(mv[: hxa_rw.HEADER.size]), len(mv))
+    if errors:
+        raise HXAValidationError.from_violation(errors[0])
+
+    _, version, node_count = hxa_rw.HEADER.unpack_from(mv, 0)
+    o = hxa_rw.HEADER.size
+
+    nodes = []
+    for nc in range(node_count):
+        node, o = unpack_node_checked(mv, o, nc, node_count, copy)
+        nodes.append(node)
+
+    if o != len(mv):
+        raise HXAValidationError(f"{len(mv) - o} bytes of trailing data", offset=o)
+
+    # layers are only copied once the whole file has passed
+    if copy:
+        for node in nodes:
+            copy_layers(node)
+    return hxa.HXAFile(version, nodes)
+
+
+# *** Validating read functions (end)
+
+
+def hxa_util_validate(hxa_file):
+    """Validate an in memory HXAFile, logging every violation. Returns a bool."""
+    errors = validate_hxa(hxa_file)
+    for e in errors:
+        log.info(f"HxA Verify Error: {format_violation(e)}")
+    return not errors
 
 
 if __name__ == "__main__":
-    argc = len(argv)
-    if argc == 1:
-        log.info("Add a filename (ex: py hxapy_validate.py cube.hxa)")
-        exit()
-
-    # for now, we have a single filename after the script:
-    # - py hxapy_validate.py filename
-    filename = argv[-1]
-    with open(filename, "wb") as f:
-        hxafile = hxa_rw.read_hxa(f)
-
-    valid = hxa_util_validate(hxafile)
-    if not valid:
-        log.info(f"{filename} could not pass validation")
-    if valid:
-        log.info(f"{filename} validated")
+    # python -m io_scene_hxa.hxapy_validate cube.hxa
+    # (python -m io_scene_hxa validate takes many files, globs and directories)
+    if len(sys.argv) == 1:
+        print("Add a filename (ex: python -m io_scene_hxa.hxapy_validate cube.hxa)")
+        sys.exit(2)
+
+    filename = sys.argv[-1]
+    report = validate_file(filename)
+    for e in report["errors"]:
+        print(format_violation(e))
+    if not report["valid"]:
+        print(f"{filename} could not pass validation")
+        sys.exit(1)
+    print(f"{filename} validated")
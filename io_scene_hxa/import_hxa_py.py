@@ -7,7 +7,9 @@ from bpy_extras.io_utils import (
 )
 
 from . import hxapy_read_write as hxa_rw
+from . import hxapy_compress as hxa_z
 from . import hxapy_util as hxa_util
+from . import hxapy_topology as hxa_topology
 from . import hxapy_validate as hxa_valid
 
 import logging
@@ -23,7 +25,7 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
     bl_options = {"REGISTER"}
 
     filename_ext = ".hxa"
-    filter_glob: StringProperty(default="*.hxa", options={"HIDDEN"})
+    filter_glob: StringProperty(default="*.hxa;*.hxa.z", options={"HIDDEN"})
 
     def execute(self, context):
         try:
@@ -36,12 +38,19 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
             log.info(f"HXA Error: File {self.filepath} could not be open for reading\n")
             return {"CANCELLED"}
 
-        hxa_dict = hxa_rw.read_hxa(f)
-        f.close()
-
-        if not hxa_valid.hxa_util_validate(hxa_dict):
-            self.report({"ERROR"}, f"{self.filepath} couldn't pass validation")
-            log.info(f"{self.filepath} couldn't pass validation")
+        # plain files are validated while they're parsed and rejected at the first
+        # violation, without reading the rest
+        try:
+            with f:
+                if hxa_z.is_compressed(f):
+                    hxa_file = hxa_z.read_hxa_z(f)
+                    if not hxa_valid.hxa_util_validate(hxa_file):
+                        raise hxa_valid.HXAValidationError("see the log for details")
+                else:
+                    hxa_file = hxa_valid.read_hxa_validated(hxa_rw.map_file(f))
+        except hxa_valid.HXAValidationError as e:
+            self.report({"ERROR"}, f"{self.filepath} couldn't pass validation: {e}")
+            log.info(f"{self.filepath} couldn't pass validation: {e}")
             return {"CANCELLED"}
 
         meta_shapekeys = None
@@ -60,11 +69,9 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
         meta_bones_tails = None
         meta_bones_names = None
         meta_bones_parents = None
-        meta_data_count = hxa_dict["nodes"][0]["meta_data_count"]
-        if meta_data_count > 0:
-            meta_data = hxa_dict["nodes"][0]["meta_data"]
-
-            metas_present = {meta["name"]: meta for meta in meta_data}
+        node = hxa_file.nodes[0]
+        if node.meta_data_count > 0:
+            metas_present = {meta.name: meta for meta in node.meta_data}
             meta_meshdata = metas_present["meta mesh data"]
 
             if "meta shapekeys" in metas_present.keys():
@@ -86,31 +93,29 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
                 meta_creases = metas_present["meta creases"]
 
             # ** mesh data
-            meta_meshdata_entries = meta_meshdata["data"]
-            metas_present = {meta["name"]: meta for meta in meta_meshdata_entries}
+            meta_meshdata_entries = meta_meshdata.data
+            metas_present = {meta.name: meta for meta in meta_meshdata_entries}
 
             if "meta objectname" in metas_present.keys():
                 meta_objectname = metas_present["meta objectname"]
-                log.debug(meta_objectname["data"])
+                log.debug(meta_objectname.data)
 
             if "meta meshname" in metas_present.keys():
                 meta_meshname = metas_present["meta meshname"]
-                log.debug(meta_meshname["data"])
+                log.debug(meta_meshname.data)
 
             if "meta location" in metas_present.keys():
                 meta_location = metas_present["meta location"]
-                log.debug(meta_location["data"])
+                log.debug(meta_location.data)
 
             if "meta scale" in metas_present.keys():
                 meta_scale = metas_present["meta scale"]
-                log.debug(meta_scale["data"])
+                log.debug(meta_scale.data)
 
             # ** armature data
             if meta_armaturedata:
-                meta_armaturedata_entries = meta_armaturedata["data"]
-                metas_present = {
-                    meta["name"]: meta for meta in meta_armaturedata_entries
-                }
+                meta_armaturedata_entries = meta_armaturedata.data
+                metas_present = {meta.name: meta for meta in meta_armaturedata_entries}
 
                 if "meta armature location" in metas_present.keys():
                     meta_armature_location = metas_present["meta armature location"]
@@ -131,96 +136,95 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
                     meta_bones_parents = metas_present["meta bones parents"]
 
 
-        vertex_count = hxa_dict["nodes"][0]["content"]["vertex_count"]
-        vert_data = hxa_dict["nodes"][0]["content"]["vertex_stack"]["layers"][0]["data"]
-        ref_data = hxa_dict["nodes"][0]["content"]["corner_stack"]["layers"][0]["data"]
+        vertex_count = node.vertex_count
+        vert_data = node.vertex_stack.layers[0].data
+        ref_data = node.corner_stack.layers[0].data
 
-        # - Add edge verts to the mesh, then write creases to mesh after picking out the edges?
-        verts = hxa_util.break_list_up(vert_data, vertex_count * 3, 3)
+        # the edges come from the reference layer, so Blender doesn't have to find
+        # them; the crease edges add the loose ones
+        topology = hxa_topology.build_topology(ref_data, node.edge_corner_count)
+        edges = topology["edges"]
 
         if meta_creases:
-            edge_data = meta_creases["data"][0]["data"]
-            arrlen = len(meta_creases["data"][0]["data"])
-            edges = hxa_util.break_list_up(edge_data, arrlen, 2)
-            crease_values = meta_creases["data"][1]["data"]
+            edge_data = meta_creases.data[0].data
+            edges = hxa_topology.merge_edges(edges, edge_data)
+            crease_values = meta_creases.data[1].data
 
             crease_dict = {}
-            for i in range(len(edges)):
-                e = edges[i]
-                k = str(f"{e[0]} {e[1]}")
-                v = crease_values[i]
-                crease_dict[k] = v
-        else:
-            edges = []  # for now
+            crease_edges = hxa_util.as_rows(edge_data, 2, typecode="q").tolist()
+            for i in range(len(crease_edges)):
+                crease_dict[tuple(sorted(crease_edges[i]))] = crease_values[i]
 
-        faces = hxa_util.restore_faces(ref_data)
+        offsets, sizes, corners = hxa_util.decode_faces(
+            ref_data, node.edge_corner_count
+        )
 
         if meta_meshname:
-            me_name = meta_meshname["data"]
+            me_name = meta_meshname.data
         else:
             me_name = "imported HxA mesh"
         
         if meta_objectname:
-            ob_name = meta_objectname["data"]
+            ob_name = meta_objectname.data
         else:
             ob_name = "imported HxA object"
 
-        restore_mesh(verts, edges, faces, me_name, ob_name)
+        restore_mesh(
+            vert_data[: vertex_count * 3],
+            edges,
+            offsets,
+            sizes,
+            corners,
+            topology["corner_edge"],
+            me_name,
+            ob_name,
+        )
         
         mesh_object = bpy.context.object
 
         if meta_location:
-            x, y, z = meta_location["data"]
+            x, y, z = meta_location.data
 
             mesh_object.location.x = x
             mesh_object.location.y = y
             mesh_object.location.z = z
 
         if meta_scale:
-            x, y, z = meta_scale["data"]
+            x, y, z = meta_scale.data
 
             mesh_object.scale.x = x
             mesh_object.scale.y = y
             mesh_object.scale.z = z
 
         if meta_armature_location:
-            armature_location = meta_armature_location["data"]
+            armature_location = meta_armature_location.data
 
         if meta_armature_scale:
-            armature_scale = meta_armature_scale["data"]
+            armature_scale = meta_armature_scale.data
 
         if meta_creases:
-            mesh_edges = mesh_object.data.edges
-            edge_verts = [list(e.vertices) for e in mesh_object.data.edges]
-            for i in range(len(crease_values)):
-                e = edge_verts[i]
-                k = str(f"{e[0]} {e[1]}")
-                mesh_edges[i].crease = crease_dict[k]
+            for mesh_edge in mesh_object.data.edges:
+                crease = crease_dict.get(tuple(sorted(mesh_edge.vertices)))
+                if crease is not None:
+                    mesh_edge.crease = crease
 
         if meta_shapekeys:
-            shapekeys_data = meta_shapekeys["data"]
+            shapekeys_data = meta_shapekeys.data
 
-            for i in range(len(shapekeys_data)):
-                shapekeys_values = hxa_util.break_list_up(
-                    shapekeys_data[i]["data"], vertex_count * 3, 3
-                )
+            # every key is written in one go, the first(the basis) is taken from
+            # the mesh and the others copy it rather than evaluating the mix
+            for shapekey_data in shapekeys_data:
                 shapekey = mesh_object.shape_key_add(
-                    name=shapekeys_data[i]["name"], from_mix=True
+                    name=shapekey_data.name, from_mix=False
                 )
-                for i in range(vertex_count):
-                    shapekey.data[i].co = shapekeys_values[i]
+                co = hxa_util.as_buffer(shapekey_data.data[: vertex_count * 3], "f")
+                shapekey.data.foreach_set("co", co)
 
         if meta_armaturedata:
-            bone_count = len(meta_bones_heads["data"]) / 3
-            heads = hxa_util.break_list_up(
-                meta_bones_heads["data"], int(bone_count) * 3, 3
-            )
-
-            tails = hxa_util.break_list_up(
-                meta_bones_tails["data"], int(bone_count) * 3, 3
-            )
-            names = [x["data"] for x in meta_bones_names["data"]]
-            parents = [x["data"] for x in meta_bones_parents["data"]]
+            heads = hxa_util.as_rows(meta_bones_heads.data, 3).tolist()
+            tails = hxa_util.as_rows(meta_bones_tails.data, 3).tolist()
+            names = [x.data for x in meta_bones_names.data]
+            parents = [x.data for x in meta_bones_parents.data]
 
             restore_armature(
                 armature_location, armature_scale, heads, tails, names, parents
@@ -237,28 +241,31 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
             bpy.context.view_layer.objects.active = ob_arm
             bpy.ops.object.parent_set(type="ARMATURE_NAME")
 
-        # - does this exist without armatures? (does this need to get indented into the armature block :) )
         # *** Vertex weights
         if (meta_weightindexes != None) & (meta_vertexweights != None):
-            vindex_list = meta_weightindexes["data"]
-            vgroup_list = meta_vertexweights["data"]
-
-            # ** write weights
-            for i in range(int(bone_count)):
-                indexes = vindex_list[i]["data"]
-                weights = vgroup_list[i]["data"]
-                vgroup_size = len(weights)
-                for j in range(vgroup_size):
-                    mesh_object.vertex_groups[i].add(
-                        [indexes[j]], weights[j], "REPLACE"
-                    )
+            vindex_list = meta_weightindexes.data
+            vgroup_list = meta_vertexweights.data
+
+            # parenting to an armature makes a group per bone, without one(or for
+            # groups beyond the bones) the groups are made here
+            while len(mesh_object.vertex_groups) < len(vindex_list):
+                mesh_object.vertex_groups.new()
+
+            # ** write weights, one add per distinct weight of a group
+            for i in range(len(vindex_list)):
+                vertex_group = mesh_object.vertex_groups[i]
+                # a group with a single member is read as a scalar
+                indexes = hxa_rw.ensure_array(vindex_list[i].data)
+                weights = hxa_rw.ensure_array(vgroup_list[i].data)
+                for weight, bucket in hxa_util.group_by_weight(indexes, weights):
+                    vertex_group.add(bucket, weight, "REPLACE")
 
         # *** Custom properties
         # assumption: custom props are saved on the mesh object. It's fine, but something to think about.
         if meta_customproperties:
-            customprop_entries = meta_customproperties["data"]
+            customprop_entries = meta_customproperties.data
             for customprop in customprop_entries:
-                mesh_object[customprop["name"]] = customprop["data"]
+                mesh_object[customprop.name] = customprop.data
 
 
         bpy.ops.object.shade_flat()
@@ -266,9 +273,42 @@ class ImportHXA(bpy.types.Operator, ImportHelper):
         return {"FINISHED"}
 
 
-def restore_mesh(verts, edges, faces, mesh_name="mesh", object_name="object"):
+def restore_mesh(
+    verts,
+    edges,
+    offsets,
+    sizes,
+    corners,
+    corner_edge,
+    mesh_name="mesh",
+    object_name="object",
+):
+    """
+    Build the mesh straight from the decoded buffers: the vertices, the (n, 2) edge
+    table and the faces as CSR(see hxa_util.decode_faces) with every corner's edge.
+    Everything is filled with foreach_set, and since the edges are given Blender
+    doesn't have to calculate them.
+    """
     test_mesh = bpy.data.meshes.new(name=mesh_name)
-    test_mesh.from_pydata(verts, edges, faces)
+
+    test_mesh.vertices.add(len(verts) // 3)
+    test_mesh.vertices.foreach_set("co", hxa_util.as_buffer(verts, "f"))
+
+    test_mesh.edges.add(len(edges))
+    test_mesh.edges.foreach_set("vertices", hxa_util.flatten(edges, "i"))
+
+    test_mesh.loops.add(len(corners))
+    test_mesh.loops.foreach_set("vertex_index", hxa_util.as_buffer(corners, "i"))
+    test_mesh.loops.foreach_set("edge_index", hxa_util.as_buffer(corner_edge, "i"))
+
+    test_mesh.polygons.add(len(sizes))
+    test_mesh.polygons.foreach_set("loop_start", hxa_util.as_buffer(offsets, "i"))
+    # loop_total follows from loop_start and is read-only in newer Blender versions
+    if not test_mesh.polygons.bl_rna.properties["loop_total"].is_readonly:
+        test_mesh.polygons.foreach_set("loop_total", hxa_util.as_buffer(sizes, "i"))
+
+    # the file has been validated on read, so the mesh isn't validated again
+    test_mesh.update(calc_edges=False)
 
     test_object = bpy.data.objects.new(name=object_name, object_data=test_mesh)
 
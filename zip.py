@@ -16,6 +16,11 @@ to_zip = [
     "io_scene_hxa\\hxapy_header.py",
     "io_scene_hxa\\hxapy_read_write.py",
     "io_scene_hxa\\hxapy_validate.py",
+    "io_scene_hxa\\hxapy_toc.py",
+    "io_scene_hxa\\hxapy_batch.py",
+    "io_scene_hxa\\hxapy_compress.py",
+    "io_scene_hxa\\hxapy_topology.py",
+    "io_scene_hxa\\__main__.py",
 ]
 
 